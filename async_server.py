@@ -0,0 +1,492 @@
+import asyncio
+import itertools
+import logging
+import secrets
+import socket
+import sys
+import time
+from collections import deque
+from typing import Any
+
+from server import (
+    RESUME_INFO,
+    anti_key_error,
+    game_summary,
+    generate_final_standings,
+    generate_leaderboard_state,
+    generate_question,
+    grade_answer,
+    leaderboard_messages,
+    load_config,
+    report_game_summary
+)
+import event_log
+from event_log import player_id
+from leaderboard import Leaderboard
+import metrics
+from question_pack import open_question_dealer
+from questions import new_game_rng
+from protocol import JSON_CODEC, Codec, FrameDecoder, FrameTooLarge, negotiate_codec, read_frame
+
+#Same config file and JSON-lines protocol as server.py, but every connection is one asyncio task
+#and each question is serialized and broadcast once instead of spawning a thread per player
+
+HI_TIMEOUT = 2.0
+MAX_WRITE_BUFFER = 1 << 20
+
+logger = logging.getLogger("async_server")
+
+# === HANDLE MESSAGES ===
+
+async def read_message(reader: asyncio.StreamReader, decoder: FrameDecoder, codec: Codec = JSON_CODEC,
+                       player: "Player | None" = None) -> dict[str, Any] | None:
+    #With `player`, frames are decoded with its codec as it is when they arrive, not when the read started:
+    #READY switches it while the player's read loop is already waiting here
+    while True:
+        try:
+            frame = await read_frame(reader, decoder, metrics.BYTES_RECEIVED.inc)
+        except FrameTooLarge:
+            metrics.DECODE_ERRORS.inc()
+            return None
+        if frame is None:
+            return None
+
+        try:
+            message = codec_of(player, codec).decode(frame)
+        except ValueError:
+            metrics.DECODE_ERRORS.inc()
+            continue
+        metrics.count_received(message)
+        return message
+
+def codec_of(player: "Player | None", default: Codec) -> Codec:
+    return default if player is None else player.codec
+
+class Player:
+
+    __slots__ = ("addr", "username", "reader", "writer", "decoder", "codec", "offered_codec", "connected")
+
+    def __init__(self, addr: tuple[str, int], username: str, reader: asyncio.StreamReader,
+                 writer: asyncio.StreamWriter, decoder: FrameDecoder):
+        self.addr = addr
+        self.username = username
+        self.reader = reader
+        self.writer = writer
+        self.decoder = decoder
+        self.codec = JSON_CODEC
+        self.offered_codec: Codec | None = None  # switched to once READY is sent
+        self.connected = True
+
+    def switch_codec(self, codec: Codec):
+        self.codec = codec
+        self.decoder.set_framing(codec.framing)
+
+    def send(self, payload: bytes):
+        if not self.connected:
+            return
+        try:
+            self.writer.write(payload)
+        except (ConnectionError, RuntimeError):
+            self.close()
+            return
+        metrics.BYTES_SENT.inc(len(payload))
+        # Never let one stalled reader grow its buffer without bound
+        if self.writer.transport.get_write_buffer_size() > MAX_WRITE_BUFFER:
+            self.close()
+
+    def close(self):
+        if not self.connected:
+            return
+        self.connected = False
+        metrics.PLAYERS_CONNECTED.dec()
+        try:
+            self.writer.close()
+        except (ConnectionError, RuntimeError):
+            pass
+
+# === HANDLE TRIVIA FEATURES ===
+
+class Room:
+#One game: fills up to `size` players, then plays every question in config["question_types"]
+
+    def __init__(self, room_id: int, config: dict[str, Any], size: int, seed: int | None = None):
+        self.room_id = room_id
+        self.config = config
+        self.size = size
+        self.seed, self.rng = new_game_rng(seed)
+        self.players: dict[tuple[str, int], Player] = {}
+        self.usernames: dict[tuple[str, int], str] = {}
+        self.board = Leaderboard()
+        self.latencies: dict[tuple[str, int], list[float]] = {}
+        self.tokens: dict[str, tuple[str, int]] = {}  # session token from READY -> seat
+        self.started = False
+
+        self.question_data: dict[str, Any] | None = None
+        self.pending: set[tuple[str, int]] = set()
+        self.answered = asyncio.Event()
+        self.sent_at = 0.0
+
+    def is_full(self) -> bool:
+        return len(self.players) >= self.size
+
+    def log(self, text: str, level: int = logging.INFO):
+        # stacklevel=2 so rate limiting (metrics.RateLimitFilter) tells call sites apart
+        logger.log(level, f"[room {self.room_id}] {text}", stacklevel=2)
+
+    def add(self, player: Player):
+        self.players[player.addr] = player
+        self.usernames[player.addr] = player.username
+        self.board.add(player.addr, player.username)
+        self.latencies[player.addr] = []
+        metrics.PLAYERS_CONNECTED.inc()
+        self.log(f"Player joined: {player.username} from {player.addr}")
+        codec = player.offered_codec.name if player.offered_codec is not None else "json"
+        event_log.record("handshake", self.room_id, player=player_id(player.addr), username=player.username,
+                         codec=codec)
+
+    def broadcast(self, message: dict[str, Any]):
+        #Serialized once per codec in use, every player of that codec gets the same bytes
+        with metrics.BROADCAST_SECONDS.time():
+            payloads: dict[str, bytes] = {}
+            sent = 0
+            for player in self.players.values():
+                if not player.connected:
+                    continue
+                payload = payloads.get(player.codec.name)
+                if payload is None:
+                    payload = payloads[player.codec.name] = player.codec.encode(message)
+                player.send(payload)
+                sent += 1
+            metrics.MESSAGES_SENT.labels(message["message_type"]).inc(sent)
+
+    def send_each(self, messages: dict[tuple[str, int], dict[str, Any]]):
+        #Players given the same message object share its bytes
+        payloads: dict[tuple[str, int], bytes] = {}
+        for addr, message in messages.items():
+            player = self.players[addr]
+            key = (player.codec.name, id(message))
+            payload = payloads.get(key)
+            if payload is None:
+                payload = payloads[key] = player.codec.encode(message)
+            player.send(payload)
+            metrics.MESSAGES_SENT.labels(message["message_type"]).inc()
+
+    def send_ready(self, ready_message: dict[str, Any]):
+        #Every READY carries that player's session token, so each one is encoded on its own
+        for addr, player in self.players.items():
+            token = secrets.token_urlsafe(16)
+            self.tokens[token] = addr
+            self.send_handshake(player, {**ready_message, "token": token}, player.offered_codec)
+
+    def send_handshake(self, player: Player, ready_message: dict[str, Any], codec: Codec | None):
+        if codec is not None:
+            ready_message["codec"] = codec.name
+        player.send(JSON_CODEC.encode(ready_message))
+        metrics.MESSAGES_SENT.labels("READY").inc()
+        if codec is not None:
+            player.switch_codec(codec)
+
+    def resume(self, player: Player, token: str, codec: Codec | None, address: tuple[str, int]):
+        #`player` is a new connection for the seat at player.addr; it is sent from the next question on
+        old = self.players[player.addr]
+        self.players[player.addr] = player
+        old.close()
+        metrics.PLAYERS_CONNECTED.inc()
+        metrics.RESUMES.inc()
+        self.log(f"{player.username} reconnected from {address}, rejoining at the next question")
+        event_log.record("resume", self.room_id, player=player_id(player.addr), address=player_id(address))
+
+        info = anti_key_error(self.config.get("resume_info", RESUME_INFO), self.config, {"username": player.username})
+        self.send_handshake(player, {"message_type": "READY", "info": info, "token": token, "resumed": True}, codec)
+
+        # The question in progress, if any, went out before this connection existed
+        if player.addr in self.pending:
+            self.pending.discard(player.addr)
+            if not self.pending:
+                self.answered.set()
+
+    async def read_loop(self, player: Player):
+        while player.connected:
+            message = await read_message(player.reader, player.decoder, player=player)
+            if self.players.get(player.addr) is not player:
+                return  # replaced by a reconnect
+            if message is None or (message.get("message_type") or "") == "BYE":
+                self.drop(player)
+                return
+
+            if player.addr in self.pending:
+                self.on_answer(player, message)
+
+    def on_answer(self, player: Player, message: dict[str, Any]):
+        self.pending.discard(player.addr)
+
+        latency = time.monotonic() - self.sent_at
+        self.latencies[player.addr].append(latency)
+        player_answer = str(message.get("answer", ""))
+        points, result_message = grade_answer(player_answer, self.question_data, self.config, latency)
+        self.board.update(player.addr, points)
+        player.send(player.codec.encode(result_message))
+        event_log.record("answer", self.room_id, player=player_id(player.addr), n=self.question_data["question_num"],
+                         answer=player_answer, correct=result_message["correct"], points=points,
+                         latency=round(latency, 6))
+        if points:
+            event_log.record("score", self.room_id, player=player_id(player.addr), delta=points,
+                             score=self.board.score(player.addr))
+        metrics.MESSAGES_SENT.labels("RESULT").inc()
+
+        if not self.pending:
+            self.answered.set()
+
+    def drop(self, player: Player):
+        if self.players.get(player.addr) is not player:
+            player.close()  # an old connection for a seat that has since been resumed
+            return
+        if player.connected:
+            self.log(f"{player.username} disconnected")
+            if self.started:
+                metrics.DISCONNECTS.inc()
+            event_log.record("disconnect", self.room_id, player=player_id(player.addr))
+        player.close()
+
+        if not self.started:
+            # Free the seat so the lobby can fill it with someone else
+            self.players.pop(player.addr, None)
+            self.usernames.pop(player.addr, None)
+            self.board.discard(player.addr)
+            self.latencies.pop(player.addr, None)
+            return
+
+        self.pending.discard(player.addr)
+        if not self.pending:
+            self.answered.set()
+
+    async def run(self):
+        self.started = True
+        config = self.config
+
+        ready_info = anti_key_error(config["ready_info"], config)
+        self.send_ready({"message_type": "READY", "info": ready_info})
+        await asyncio.sleep(config["question_interval_seconds"])
+
+        total_questions = len(config["question_types"])
+        self.log(f"Game seed: {self.seed}")
+        event_log.record("game_start", self.room_id, **event_log.game_fields(self.seed, config))
+        dealer = open_question_dealer(config, self.rng, self.log)
+        for question_num, question_type in enumerate(config["question_types"], start=1):
+            question_data = generate_question(question_type, config, question_num, dealer, self.rng)
+            question_message = {
+                "message_type": "QUESTION",
+                "question_type": question_data["question_type"],
+                "short_question": question_data["short_question"],
+                "time_limit": config["question_seconds"],
+                "trivia_question": question_data["trivia_question"],
+            }
+
+            self.question_data = question_data
+            self.pending = {addr for addr, player in self.players.items() if player.connected}
+            self.answered.clear()
+            self.sent_at = time.monotonic()
+            self.broadcast(question_message)
+            metrics.QUESTIONS.inc()
+            event_log.record("question", self.room_id, n=question_num, question_type=question_data["question_type"],
+                             short_question=question_data["short_question"],
+                             time_limit=question_data["time_limit"], players=len(self.pending))
+            self.log(f"Sent question {question_num} to {len(self.pending)} players")
+
+            if self.pending:
+                try:
+                    await asyncio.wait_for(self.answered.wait(), question_data["time_limit"])
+                except asyncio.TimeoutError:
+                    pass
+            self.pending = set()
+
+            if question_num < total_questions:
+                messages = leaderboard_messages(self.board, self.players, config)
+                if messages is None:
+                    leaderboard_text = generate_leaderboard_state(self.board, config)
+                    self.broadcast({"message_type": "LEADERBOARD", "state": leaderboard_text})
+                else:
+                    self.send_each(messages)
+                await asyncio.sleep(config["question_interval_seconds"])
+
+        await self.finish()
+
+    async def finish(self):
+        self.tokens.clear()
+        event_log.record("game_end", self.room_id)
+        final_standings = generate_final_standings(self.board, self.config)
+        self.broadcast({"message_type": "FINISHED", "final_standings": final_standings})
+
+        writers = [player.writer for player in self.players.values() if player.connected]
+        await asyncio.gather(*(w.drain() for w in writers), return_exceptions=True)
+        for player in self.players.values():
+            player.close()
+
+        summary = game_summary(self.seed, self.board, self.latencies, self.config)
+        report_game_summary(summary, self.config, self.room_id, self.log)
+
+class Lobby:
+#Matchmakes handshaken players into rooms and runs full rooms concurrently
+#Without "multi_room" the lobby closes after its first room, like server.py
+
+    def __init__(self, config: dict[str, Any]):
+        self.config = config
+        self.room_size = config.get("room_size", config["players"])
+        self.multi_room = bool(config.get("multi_room", False))
+        self.max_rooms = config.get("max_rooms")
+
+        self.room_ids = itertools.count(1)
+        self.waiting: Room | None = None
+        self.queued: deque[Room] = deque()
+        self.rooms: dict[int, Room] = {}
+        self.closed = False
+        self.done = asyncio.Event()
+
+        self.tasks: set[asyncio.Task] = set()
+        self.room_tasks: set[asyncio.Task] = set()
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        # Connections keep being read after the lobby closes, a dropped player may be coming back
+        task = asyncio.current_task()
+        self.tasks.add(task)
+        try:
+            await self.handshake(reader, writer)
+        finally:
+            self.tasks.discard(task)
+
+    async def handshake(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        addr = writer.get_extra_info("peername")[:2]
+        sock = writer.get_extra_info("socket")
+        if sock is not None:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+        metrics.CONNECTIONS.inc()
+        decoder = FrameDecoder()
+        try:
+            message = await asyncio.wait_for(read_message(reader, decoder), HI_TIMEOUT)
+        except asyncio.TimeoutError:
+            message = None
+
+        if message is None:
+            metrics.HANDSHAKE_FAILURES.inc()
+            writer.close()
+            return
+
+        if message.get("message_type") == "RESUME":
+            await self.resume(message, addr, reader, writer, decoder)
+            return
+
+        username = message.get("username", "")
+        if not isinstance(username, str):
+            logger.info(f"Invalid username from {addr}")
+            metrics.HANDSHAKE_FAILURES.inc()
+            writer.close()
+            return
+
+        if self.closed:
+            writer.close()
+            return
+
+        player = Player(addr, username, reader, writer, decoder)
+        if "codecs" in message:
+            player.offered_codec = negotiate_codec(message["codecs"])
+        room = self.join(player)
+        await room.read_loop(player)
+
+    async def resume(self, message: dict[str, Any], addr: tuple[str, int], reader: asyncio.StreamReader,
+                     writer: asyncio.StreamWriter, decoder: FrameDecoder):
+        #RESUME with a token from a running room's READY takes that seat back over
+        token = message.get("token")
+        room = None
+        if isinstance(token, str):
+            room = next((room for room in self.rooms.values() if token in room.tokens), None)
+        if room is None:
+            logger.info(f"Turned away {addr}, no running game for its session token")
+            metrics.HANDSHAKE_FAILURES.inc()
+            writer.close()
+            return
+
+        seat = room.tokens[token]
+        player = Player(seat, room.usernames[seat], reader, writer, decoder)
+        codec = negotiate_codec(message["codecs"]) if "codecs" in message else None
+        room.resume(player, token, codec, addr)
+        await room.read_loop(player)
+
+    def join(self, player: Player) -> Room:
+        if self.waiting is None:
+            room_id = next(self.room_ids)
+            seed = self.config.get("seed")
+            if seed is not None:
+                # Every room gets its own reproducible game
+                seed += room_id - 1
+            self.waiting = Room(room_id, self.config, self.room_size, seed)
+        room = self.waiting
+        room.add(player)
+
+        if room.is_full():
+            self.waiting = None
+            self.queued.append(room)
+            if not self.multi_room:
+                self.closed = True
+            self.start_queued()
+        return room
+
+    def start_queued(self):
+        while self.queued and (self.max_rooms is None or len(self.rooms) < self.max_rooms):
+            room = self.queued.popleft()
+            self.rooms[room.room_id] = room
+            task = asyncio.create_task(self.run_room(room))
+            self.room_tasks.add(task)
+            task.add_done_callback(self.room_tasks.discard)
+
+    async def run_room(self, room: Room):
+        room.log(f"Starting with {len(room.players)} players ({len(self.rooms)} rooms running)")
+        try:
+            await room.run()
+        finally:
+            del self.rooms[room.room_id]
+            room.log("Finished")
+            if self.closed and not self.rooms and not self.queued:
+                self.done.set()
+            else:
+                self.start_queued()
+
+    async def wait_closed(self):
+        await self.done.wait()
+
+        # Closed transports feed EOF to the readers, letting every connection task finish
+        if self.tasks:
+            _, still_running = await asyncio.wait(set(self.tasks), timeout=1.0)
+            for task in still_running:
+                task.cancel()
+
+# --- MAIN
+
+async def serve(config: dict[str, Any]):
+    port = config["port"]
+    lobby = Lobby(config)
+
+    try:
+        server = await asyncio.start_server(
+            lobby.handle_connection, "0.0.0.0", port,
+            backlog=max(lobby.room_size, 128)
+        )
+    except OSError:
+        print(f"async_server.py: Binding to port {port} was unsuccessful", file=sys.stderr)
+        sys.exit(1)
+
+    logger.info(f"Server listening on port {port}...")
+    async with server:
+        await lobby.wait_closed()
+
+def main():
+    config = load_config("async_server.py")
+    metrics.setup_logging(config)
+    metrics.start_metrics_server(config, "async_server.py")
+    event_log.open_event_log(config, "async_server.py")
+    asyncio.run(serve(config))
+    event_log.close_event_log()
+    sys.exit(0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+from typing import Sequence
+
+import numpy as np
+
+from solvers import normalize_question_type, roman_to_int
+
+#Vectorized answers for whole arrays of short_questions, one question type at a time
+#Used to validate question packs and bulk-grade replays; the game itself still answers one
+#question at a time. Results match the scalar answer_* functions in solvers.py exactly.
+
+# === HANDLE ANSWER COMPUTATION ===
+
+def answer_mathematics_batch(expressions: Sequence[str]) -> list[str]:
+    #Parsed straight from the bytes: every run of digits is a number, negative when "- " comes before it.
+    #Numbers are built a digit column at a time, so no int() is called per token
+    data = np.frombuffer("\n".join(expressions).encode("ascii"), dtype=np.uint8)
+    digits = (data >= ord("0")) & (data <= ord("9"))
+    edges = np.diff(digits.view(np.int8), prepend=0, append=0)
+    starts = np.flatnonzero(edges == 1)
+    lengths = np.flatnonzero(edges == -1) - starts
+
+    numbers = np.zeros(len(starts), dtype=np.int64)
+    for column in range(int(lengths.max())):
+        longer = lengths > column
+        numbers[longer] = numbers[longer] * 10 + (data[starts[longer] + column] - ord("0"))
+    negative = (starts >= 2) & (data[np.maximum(starts - 2, 0)] == ord("-"))
+    numbers[negative] *= -1
+
+    expression = np.searchsorted(np.flatnonzero(data == ord("\n")), starts)
+    first = np.flatnonzero(np.diff(expression, prepend=-1))
+    return to_strings(np.add.reduceat(numbers, first))
+
+def to_strings(values: np.ndarray) -> list[str]:
+    #Answers mostly span a small range, where formatting each value once and indexing is cheaper
+    if not len(values):
+        return []
+    low = int(values.min())
+    high = int(values.max())
+    if high - low > 2 * len(values):
+        return list(map(str, values.tolist()))
+    table = np.array([str(value) for value in range(low, high + 1)], dtype=object)
+    return table[values - low].tolist()
+
+def roman_to_int_batch(numerals: Sequence[str]) -> list[str]:
+    #A canonical numeral is one dict lookup in solvers.roman_to_int, faster than any array pass over it
+    return list(map(roman_to_int, numerals))
+
+def parse_subnets(subnets: Sequence[str]) -> tuple[np.ndarray, np.ndarray]:
+    #Returns (address, prefix) arrays; every subnet is five integers "a.b.c.d/p"
+    fields = ".".join(subnets).replace("/", ".").split(".")
+    fields = np.fromiter(map(int, fields), dtype=np.uint64, count=len(fields)).reshape(len(subnets), 5)
+    addresses = (fields[:, 0] << 24) | (fields[:, 1] << 16) | (fields[:, 2] << 8) | fields[:, 3]
+    return addresses, fields[:, 4]
+
+def prefix_masks(prefixes: np.ndarray) -> np.ndarray:
+    # uint64 so that a /0 prefix can shift by 32
+    return (np.uint64(0xFFFFFFFF) << (np.uint64(32) - prefixes)) & np.uint64(0xFFFFFFFF)
+
+def answer_usable_addresses_batch(subnets: Sequence[str]) -> list[str]:
+    _, prefixes = parse_subnets(subnets)
+    total = (np.uint64(1) << (np.uint64(32) - prefixes)).astype(np.int64)
+    return to_strings(np.maximum(total - 2, 0))
+
+def answer_network_broadcast_batch(subnets: Sequence[str]) -> list[str]:
+    addresses, prefixes = parse_subnets(subnets)
+    masks = prefix_masks(prefixes)
+    networks = addresses & masks
+    broadcasts = networks | (~masks & np.uint64(0xFFFFFFFF))
+    return [
+        f"{format_address(network)} and {format_address(broadcast)}"
+        for network, broadcast in zip(dotted_quads(networks), dotted_quads(broadcasts))
+    ]
+
+def dotted_quads(addresses: np.ndarray) -> list[list[int]]:
+    shifts = np.array([24, 16, 8, 0], dtype=np.uint64)
+    return ((addresses[:, None] >> shifts) & np.uint64(255)).tolist()
+
+def format_address(octets: list[int]) -> str:
+    return f"{octets[0]}.{octets[1]}.{octets[2]}.{octets[3]}"
+
+BATCH_SOLVERS = {
+    "Mathematics": answer_mathematics_batch,
+    "Roman Numerals": roman_to_int_batch,
+    "Usable IP Addresses of a Subnet": answer_usable_addresses_batch,
+    "Network and Broadcast Address of a Subnet": answer_network_broadcast_batch,
+}
+
+def answer_batch(question_type: str, short_questions: Sequence[str]) -> list[str]:
+    key = normalize_question_type(question_type)
+    if key is None:
+        raise ValueError(f"Unknown question type '{question_type}'")
+    if not short_questions:
+        return []
+    return BATCH_SOLVERS[key](short_questions)
+
+def grade_batch(question_type: str, short_questions: Sequence[str],
+                player_answers: Sequence[str]) -> np.ndarray:
+    #Boolean array, True where the player's answer matches (same comparison as server.grade_answer)
+    correct = np.array(answer_batch(question_type, short_questions))
+    given = np.array([str(answer) for answer in player_answers])
+    return given == correct
@@ -0,0 +1,35 @@
+import random
+
+from batch_answers import answer_batch
+from benchmarks.common import best_of, emit, parse_args
+from questions import QUESTION_GENERATORS
+from solvers import SOLVERS
+
+#Batch (NumPy) answer engine against calling the scalar answer functions once per question
+
+def run(quick: bool = False) -> list[dict]:
+    sizes = [1_000, 100_000] if quick else [1_000, 100_000, 1_000_000]
+    rng = random.Random(0)
+
+    rows = []
+    for question_type, generate in QUESTION_GENERATORS.items():
+        questions = [generate(rng) for _ in range(max(sizes))]
+        for size in sizes:
+            batch = questions[:size]
+            scalar_s = best_of(lambda: list(map(SOLVERS[question_type], batch)), repeat=3)
+            batch_s = best_of(lambda: answer_batch(question_type, batch), repeat=3)
+            rows.append({
+                "question_type": question_type,
+                "questions": size,
+                "scalar_ms": scalar_s * 1e3,
+                "batch_ms": batch_s * 1e3,
+                "speedup": scalar_s / batch_s,
+            })
+    return rows
+
+def main():
+    args = parse_args("Batch vs scalar answer engine per question type")
+    emit("batch_answers", run(args.quick), args.json)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+import socket
+
+from benchmarks.common import best_of, emit, parse_args
+from server import broadcast_message, encode_message
+
+#Per-broadcast cost vs player count: one encode + sendall per player (the old per-player
+#send_message path) against server.broadcast_message, which encodes once and fans out
+
+MESSAGES = {
+    "QUESTION": {
+        "message_type": "QUESTION",
+        "question_type": "Network and Broadcast Address of a Subnet",
+        "short_question": "192.168.37.201/27",
+        "time_limit": 10.55,
+        "trivia_question": "Question 4 (Network and Broadcast Address of a Subnet):\n"
+                           "What are the network and broadcast addresses of 192.168.37.201/27?",
+    },
+    "LEADERBOARD": {
+        "message_type": "LEADERBOARD",
+        "state": "\n".join(f"{rank}. player{rank}: {10 - rank} points" for rank in range(1, 11)),
+    },
+}
+
+def per_player_send(connections, message):
+    for conn in connections:
+        conn.sendall(encode_message(message))
+
+def drain(receivers):
+    for sock in receivers:
+        while True:
+            try:
+                if not sock.recv(1 << 20):
+                    break
+            except BlockingIOError:
+                break
+
+# Keeps a timed batch inside the socketpair buffers, the receivers are drained between batches
+MAX_BATCH = 64
+
+def run(quick: bool = False) -> list[dict]:
+    player_counts = [10, 100, 1000] if quick else [10, 100, 1000, 5000]
+
+    rows = []
+    for players in player_counts:
+        pairs = [socket.socketpair() for _ in range(players)]
+        senders = [a for a, _ in pairs]
+        receivers = [b for _, b in pairs]
+        for sock in senders + receivers:
+            sock.setblocking(False)
+
+        for name, message in MESSAGES.items():
+            per_player = best_of(lambda: per_player_send(senders, message),
+                                 after=lambda: drain(receivers), max_number=MAX_BATCH)
+            once = best_of(lambda: broadcast_message(senders, message),
+                           after=lambda: drain(receivers), max_number=MAX_BATCH)
+            rows.append({
+                "message": name,
+                "players": players,
+                "per_player_us": per_player * 1e6,
+                "encode_once_us": once * 1e6,
+                "speedup": per_player / once,
+            })
+
+        for a, b in pairs:
+            a.close()
+            b.close()
+    return rows
+
+def main():
+    args = parse_args("Broadcast cost per message vs player count")
+    emit("broadcast", run(args.quick), args.json)
+
+if __name__ == "__main__":
+    main()
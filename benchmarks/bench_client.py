@@ -0,0 +1,85 @@
+import threading
+import time
+
+import client
+from benchmarks.common import emit, parse_args
+from protocol import JSON_CODEC
+
+#client.receive_message over a socketpair: how fast it turns a stream of messages back into dicts (small
+#QUESTIONs and FINISHED standings for a big game), and how long an idle listener takes to stop after
+#request_shutdown() (DISCONNECT/EXIT)
+
+def finished_message(players: int) -> dict:
+    rows = "\n".join(f"{rank}. player{rank}: {players - rank} points" for rank in range(1, players + 1))
+    return {"message_type": "FINISHED", "final_standings": f"Final standings:\n{rows}\nThe winner is player1"}
+
+MESSAGES = {
+    "QUESTION": {
+        "message_type": "QUESTION",
+        "question_type": "Mathematics",
+        "short_question": "96 + 49 - 59 - 6 + 34",
+        "time_limit": 10,
+        "trivia_question": "Question 1 (Mathematics):\nWhat is 96 + 49 - 59 - 6 + 34?",
+    },
+    "FINISHED 10k players": finished_message(10_000),
+}
+
+def receive_throughput(message: dict, count: int) -> tuple[float, int]:
+    reader, writer = client.socket.socketpair()
+    payload = JSON_CODEC.encode(message)
+    sender = threading.Thread(target=lambda: writer.sendall(payload * count) or writer.close(), daemon=True)
+
+    client.clear_shutdown()
+    started = time.perf_counter()
+    sender.start()
+    received = sum(1 for _ in client.receive_message(reader))
+    elapsed = time.perf_counter() - started
+    sender.join()
+    reader.close()
+    if received != count:
+        raise RuntimeError(f"received {received} of {count} messages")
+    return elapsed, len(payload) * count
+
+def shutdown_latency() -> float:
+    reader, writer = client.socket.socketpair()
+    client.clear_shutdown()
+    listener = threading.Thread(target=lambda: list(client.receive_message(reader)), daemon=True)
+    listener.start()
+    time.sleep(0.05)  # let it block in select()
+
+    started = time.perf_counter()
+    client.request_shutdown()
+    listener.join()
+    elapsed = time.perf_counter() - started
+    reader.close()
+    writer.close()
+    return elapsed
+
+def run(quick: bool = False) -> list[dict]:
+    rows = []
+    for name, message in MESSAGES.items():
+        count = 50_000 if message["message_type"] == "QUESTION" else 50
+        if quick:
+            count //= 5
+        elapsed, size = min(receive_throughput(message, count) for _ in range(3))
+        rows.append({
+            "case": f"receive {name}",
+            "messages_per_s": count / elapsed,
+            "mb_per_s": size / elapsed / 1e6,
+            "latency_ms": None,
+        })
+    rows.append({
+        "case": "stop idle listener",
+        "messages_per_s": None,
+        "mb_per_s": None,
+        "latency_ms": min(shutdown_latency() for _ in range(5)) * 1e3,
+    })
+    client.clear_shutdown()
+    return rows
+
+def main():
+    args = parse_args("Client receive loop throughput and shutdown latency")
+    emit("client", run(args.quick), args.json)
+
+if __name__ == "__main__":
+    main()
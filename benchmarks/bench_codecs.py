@@ -0,0 +1,55 @@
+from benchmarks.common import best_of, emit, parse_args
+from protocol import CODECS, FrameDecoder
+
+#Encode/decode throughput of every installed wire codec for each protocol message type
+#Decode includes framing: the encoded frame is fed through a FrameDecoder first
+
+STANDINGS = "\n".join(f"{rank}. player{rank}: {50 - rank // 3} points" for rank in range(1, 101))
+
+MESSAGES = {
+    "HI": {"message_type": "HI", "username": "Allied Mastercomputer", "codecs": ["orjson", "json"]},
+    "READY": {"message_type": "READY", "info": "Game starts in 5.5 seconds with 4 questions and 2 players!"},
+    "QUESTION": {
+        "message_type": "QUESTION",
+        "question_type": "Mathematics",
+        "short_question": "72 + 59 + 80 - 94",
+        "time_limit": 10.55,
+        "trivia_question": "Question 1 (Mathematics):\nWhat is 72 + 59 + 80 - 94?",
+    },
+    "ANSWER": {"message_type": "ANSWER", "answer": "117"},
+    "RESULT": {"message_type": "RESULT", "correct": True, "feedback": "117 is the correct answer!"},
+    "LEADERBOARD": {"message_type": "LEADERBOARD", "state": STANDINGS},
+    "FINISHED": {"message_type": "FINISHED", "final_standings": "Final standings:\n" + STANDINGS},
+}
+
+def framed_decode(codec, decoder, frame):
+    decoder.feed(frame)
+    return codec.decode(decoder.next_frame())
+
+def run(quick: bool = False) -> list[dict]:
+    repeat = 3 if quick else 5
+
+    rows = []
+    for message_type, message in MESSAGES.items():
+        for name, codec in CODECS.items():
+            frame = codec.encode(message)
+            decoder = FrameDecoder(framing=codec.framing)
+            encode = best_of(lambda: codec.encode(message), repeat=repeat)
+            decode = best_of(lambda: framed_decode(codec, decoder, frame), repeat=repeat)
+            rows.append({
+                "message": message_type,
+                "codec": name,
+                "bytes": len(frame),
+                "encode_us": encode * 1e6,
+                "decode_us": decode * 1e6,
+                "encode_msgs_per_s": 1 / encode,
+                "decode_msgs_per_s": 1 / decode,
+            })
+    return rows
+
+def main():
+    args = parse_args("Wire codec encode/decode throughput per message type")
+    emit("codecs", run(args.quick), args.json)
+
+if __name__ == "__main__":
+    main()
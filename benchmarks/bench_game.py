@@ -0,0 +1,102 @@
+import contextlib
+import io
+import selectors
+import socket
+import threading
+import time
+
+from benchmarks.common import emit, load_game_config, parse_args
+from loadgen import raise_file_limit
+from protocol import JSON_CODEC, FrameDecoder
+from server import prepare_connection, start_round
+from solvers import automatic_answer
+
+#Whole games through server.start_round against simulated auto-mode players over TCP on 127.0.0.1
+#One thread plays every client from a single selector and answers each QUESTION as soon as it
+#arrives, so the game time is the server's own overhead: broadcasts, grading, RESULTs and standings,
+#plus the loopback TCP stack every real game goes through
+
+def play_clients(sockets: list[socket.socket], answered: list[int]):
+    decoders = {sock: FrameDecoder() for sock in sockets}
+    with selectors.DefaultSelector() as selector:
+        for sock in sockets:
+            selector.register(sock, selectors.EVENT_READ)
+
+        while selector.get_map():
+            for key, _ in selector.select():
+                sock = key.fileobj
+                try:
+                    chunk = sock.recv(1 << 16)
+                except BlockingIOError:
+                    continue
+                except OSError:
+                    chunk = b""
+                if not chunk:
+                    selector.unregister(sock)
+                    sock.close()
+                    continue
+
+                decoder = decoders[sock]
+                decoder.feed(chunk)
+                for frame in decoder:
+                    message = JSON_CODEC.decode(frame)
+                    if message["message_type"] == "QUESTION":
+                        answer = automatic_answer(message["question_type"], message["short_question"])
+                        sock.sendall(JSON_CODEC.encode({"message_type": "ANSWER", "answer": answer}))
+                        answered[0] += 1
+
+def connect_players(players: int) -> tuple[dict, list[socket.socket]]:
+    #Server and client ends of `players` loopback TCP connections, keyed by the client's address as
+    #server.py keys its players
+    connections = {}
+    clients = []
+    with socket.create_server(("127.0.0.1", 0), backlog=players) as listener:
+        for _ in range(players):
+            clients.append(socket.create_connection(listener.getsockname()))
+            conn, addr = listener.accept()
+            prepare_connection(conn)
+            connections[addr] = conn
+    return connections, clients
+
+def play_game(players: int, config: dict) -> tuple[float, int]:
+    connections, client_sockets = connect_players(players)
+    usernames = {addr: f"player{number}" for number, addr in enumerate(connections)}
+
+    answered = [0]
+    clients = threading.Thread(target=play_clients, args=(client_sockets, answered), daemon=True)
+    clients.start()
+
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        start_round(connections, usernames, config)
+    elapsed = time.perf_counter() - started
+
+    clients.join()
+    return elapsed, answered[0]
+
+def run(quick: bool = False) -> list[dict]:
+    player_counts = [10, 100, 500] if quick else [10, 100, 1000, 2000]
+    raise_file_limit(2 * max(player_counts) + 64)
+    question_types = load_game_config()["question_types"] * 5
+    config = load_game_config(question_types=question_types, question_seconds=10,
+                              question_interval_seconds=0, seed=1)
+
+    rows = []
+    for players in player_counts:
+        runs = [play_game(players, config) for _ in range(1 if players > 100 else 3)]
+        elapsed, answered = min(runs)
+        rows.append({
+            "players": players,
+            "questions": len(question_types),
+            "game_ms": elapsed * 1e3,
+            "per_question_ms": elapsed * 1e3 / len(question_types),
+            "answers_per_s": answered / elapsed,
+        })
+    return rows
+
+def main():
+    args = parse_args("Full server.start_round games vs player count")
+    emit("game", run(args.quick), args.json)
+
+if __name__ == "__main__":
+    main()
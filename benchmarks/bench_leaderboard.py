@@ -0,0 +1,78 @@
+import random
+
+from benchmarks.common import best_of, emit, load_game_config, parse_args
+from leaderboard import Leaderboard
+from server import generate_leaderboard_state, generate_leaderboard_states
+
+#Standings cost vs player count: one score change, a whole question's worth of score changes plus the
+#LEADERBOARD text built after it, the text alone (what "full" mode broadcasts), and every player's text
+#in "personalized" mode. "spread" scores are spread over 20 questions; "tied" puts every player on one of
+#two scores, the worst case for anything that orders players within a score.
+
+QUESTIONS = 20
+
+def filled_board(players: int, rng: random.Random, tied: bool) -> Leaderboard:
+    board = Leaderboard()
+    for player in range(players):
+        board.add(player, f"player{player}")
+    for _ in range(1 if tied else QUESTIONS):
+        for player in range(players):
+            if tied or rng.random() < 0.6:
+                board.update(player, 1)
+    return board
+
+def run(quick: bool = False) -> list[dict]:
+    repeat = 3 if quick else 5
+    config = load_game_config(leaderboard_top=10, leaderboard_window=2)
+    rng = random.Random(0)
+
+    rows = []
+    for players in (10, 1_000, 100_000):
+        for scores in ("spread", "tied"):
+            tied = scores == "tied"
+            board = filled_board(players, rng, tied)
+            picks = [rng.randrange(players) for _ in range(1024)]
+            scorers = [player for player in range(players) if tied or rng.random() < 0.6]
+            calls = 0
+            rounds = 0
+
+            def update():
+                # +1 then -1 for the same player on alternating calls keeps the score distribution steady
+                nonlocal calls
+                board.update(picks[(calls // 2) % len(picks)], -1 if calls % 2 else 1)
+                calls += 1
+
+            def question():
+                # Everyone who scored moves up (or back down on alternate rounds), then the text is rebuilt
+                nonlocal rounds
+                points = -1 if rounds % 2 else 1
+                for player in scorers:
+                    board.update(player, points)
+                rounds += 1
+                return generate_leaderboard_state(board, config)
+
+            state = generate_leaderboard_state(board, config)
+            states = generate_leaderboard_states(board, range(players), config)
+            update_s = best_of(update, repeat=repeat)
+            question_s = best_of(question, repeat=repeat)
+            full_s = best_of(lambda: generate_leaderboard_state(board, config), repeat=repeat)
+            personalized_s = best_of(lambda: generate_leaderboard_states(board, range(players), config),
+                                     repeat=1 if players > 1_000 else repeat)
+            rows.append({
+                "players": players,
+                "scores": scores,
+                "update_us": update_s * 1e6,
+                "question_ms": question_s * 1e3,
+                "full_state_ms": full_s * 1e3,
+                "full_bytes_per_player": len(state.encode("utf-8")),
+                "personalized_ms": personalized_s * 1e3,
+                "personalized_bytes_per_player": sum(len(s.encode("utf-8")) for s in states.values()) // players,
+            })
+    return rows
+
+def main():
+    args = parse_args("Leaderboard updates and LEADERBOARD text vs player count")
+    emit("leaderboard", run(args.quick), args.json)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+import threading
+import time
+
+import requests
+
+from benchmarks.common import emit, parse_args
+from fake_ollama import start_fake_ollama
+from ollama_client import SYSTEM_PROMPT, OllamaClient
+
+#The client's "ai" mode against fake_ollama.py on loopback, so only the HTTP client's own overhead shows:
+#a new thread and a new connection per question (the old answer_question_ollama) against one pooled
+#OllamaClient, how long a question that runs out of time takes to give up, and a chatty model
+#(10 ms per chunk) answered from the full reply against the stream cut short at the answer
+
+QUESTION = "Question 1 (Mathematics):\nWhat is 96 + 49 - 59 - 6 + 34?"
+MODEL = "fake"
+
+def thread_per_question(url: str, time_limit: float) -> str | None:
+    #What answer_question_ollama did before OllamaClient
+    body = {
+        "model": MODEL,
+        "messages": [{"role": "system", "content": SYSTEM_PROMPT}, {"role": "user", "content": QUESTION}],
+        "stream": False
+    }
+    result = {"answer": None}
+
+    def do_request():
+        try:
+            r = requests.post(url, json=body, timeout=time_limit)
+            r.raise_for_status()
+            result["answer"] = r.json().get("message", {}).get("content") or ""
+        except Exception:
+            result["answer"] = None
+
+    worker = threading.Thread(target=do_request, daemon=True)
+    worker.start()
+    worker.join(timeout=time_limit)
+    return None if worker.is_alive() else result["answer"]
+
+def client_threads() -> int:
+    # Leaves out the fake server's own request threads
+    return sum(1 for thread in threading.enumerate() if "process_request" not in thread.name)
+
+def time_questions(ask, count: int, whole_reply: bool = False) -> float:
+    # whole_reply: the answer is somewhere in the model's sentence rather than all of it
+    started = time.perf_counter()
+    for _ in range(count):
+        answer = ask()
+        if answer is None or (("114" not in answer) if whole_reply else (answer != "114")):
+            raise RuntimeError("fake Ollama gave a wrong answer")
+    return (time.perf_counter() - started) / count
+
+def run(quick: bool = False) -> list[dict]:
+    count = 200 if quick else 1000
+    rows = []
+
+    server = start_fake_ollama()
+    url = f"http://127.0.0.1:{server.port}/api/chat"
+    client = OllamaClient("127.0.0.1", server.port, MODEL)
+    client.warmup()
+    cases = [
+        ("thread + new connection", lambda: thread_per_question(url, 5.0)),
+        ("pooled OllamaClient", lambda: client.chat(QUESTION, 5.0)),
+    ]
+    for name, ask in cases:
+        before = server.connections
+        per_question = time_questions(ask, count)
+        rows.append({
+            "client": name,
+            "time_limit_s": 5.0,
+            "per_question_ms": per_question * 1e3,
+            "connections_per_question": (server.connections - before) / count,
+            "threads_left": None,
+        })
+    client.close()
+    server.shutdown()
+
+    # Model slower than the time limit: both give up on time, only the old client leaves a thread behind
+    server = start_fake_ollama(delay=0.5)
+    url = f"http://127.0.0.1:{server.port}/api/chat"
+    client = OllamaClient("127.0.0.1", server.port, MODEL)
+    cases = [
+        ("thread + new connection", lambda: thread_per_question(url, 0.1)),
+        ("pooled OllamaClient", lambda: client.chat(QUESTION, 0.1)),
+    ]
+    for name, ask in cases:
+        threads = client_threads()
+        started = time.perf_counter()
+        answer = ask()
+        elapsed = time.perf_counter() - started
+        rows.append({
+            "client": name,
+            "time_limit_s": 0.1,
+            "per_question_ms": elapsed * 1e3,
+            "connections_per_question": None,
+            "threads_left": client_threads() - threads if answer is None else None,
+        })
+        time.sleep(0.6)  # let the fake server finish before the next case
+    client.close()
+    server.shutdown()
+
+    server = start_fake_ollama(token_delay=0.01, chatter=True)
+    for stream in (False, True):
+        client = OllamaClient("127.0.0.1", server.port, MODEL, stream)
+        client.warmup()
+        per_question = time_questions(lambda: client.chat(QUESTION, 30.0, "Mathematics"), 3 if quick else 10,
+                                      whole_reply=not stream)
+        rows.append({
+            "client": f"chatty model, stream {'on' if stream else 'off'}",
+            "time_limit_s": 30.0,
+            "per_question_ms": per_question * 1e3,
+            "connections_per_question": None,
+            "threads_left": None,
+        })
+        client.close()
+    server.shutdown()
+    return rows
+
+def main():
+    args = parse_args("Ollama client overhead against a local fake server")
+    emit("ollama", run(args.quick), args.json)
+
+if __name__ == "__main__":
+    main()
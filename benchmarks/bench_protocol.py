@@ -0,0 +1,52 @@
+from benchmarks.bench_codecs import MESSAGES
+from benchmarks.common import best_of, emit, parse_args
+from protocol import CODECS, FrameDecoder
+from server import decode_message, encode_message
+
+#server.encode_message/decode_message per message type, and FrameDecoder splitting a buffer of
+#pipelined frames (what a reader sees when many messages arrive in one recv)
+
+PIPELINED = 1000
+
+def split_frames(decoder: FrameDecoder, data: bytes) -> int:
+    decoder.feed(data)
+    return sum(1 for _ in decoder)
+
+def run(quick: bool = False) -> list[dict]:
+    repeat = 3 if quick else 5
+
+    rows = []
+    for message_type, message in MESSAGES.items():
+        data = encode_message(message)
+        frame = data.rstrip(b"\n")
+        encode = best_of(lambda: encode_message(message), repeat=repeat)
+        decode = best_of(lambda: decode_message(frame), repeat=repeat)
+        rows.append({
+            "case": f"{message_type} message",
+            "bytes": len(data),
+            "encode_us": encode * 1e6,
+            "decode_us": decode * 1e6,
+            "frames_per_s": None,
+        })
+
+    # Framing only: no decode, so this is the cost of finding frame boundaries
+    for name in ("json", "json-lp"):
+        codec = CODECS[name]
+        data = codec.encode(MESSAGES["ANSWER"]) * PIPELINED
+        decoder = FrameDecoder(framing=codec.framing)
+        split = best_of(lambda: split_frames(decoder, data), repeat=repeat)
+        rows.append({
+            "case": f"split {PIPELINED} {codec.framing} frames",
+            "bytes": len(data),
+            "encode_us": None,
+            "decode_us": split * 1e6,
+            "frames_per_s": PIPELINED / split,
+        })
+    return rows
+
+def main():
+    args = parse_args("encode_message/decode_message and frame splitting throughput")
+    emit("protocol", run(args.quick), args.json)
+
+if __name__ == "__main__":
+    main()
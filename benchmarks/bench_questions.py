@@ -0,0 +1,49 @@
+import random
+
+from benchmarks.common import best_of, emit, load_game_config, parse_args
+from questions import QUESTION_GENERATORS
+from server import generate_question
+from solvers import SOLVERS
+
+#Per question type: the generate_*_question function, the matching answer_* solver, and
+#server.generate_question (generate + solve + format, what the game calls once per question)
+
+# More distinct questions than solvers.parse_subnet caches, so solves are measured uncached
+SAMPLES = 1 << 17
+
+def run(quick: bool = False) -> list[dict]:
+    repeat = 3 if quick else 5
+    config = load_game_config()
+
+    rows = []
+    for question_type, generate in QUESTION_GENERATORS.items():
+        rng = random.Random(0)
+        questions = [generate(rng) for _ in range(SAMPLES)]
+        solve = SOLVERS[question_type]
+        pending = iter(())
+
+        def solve_next():
+            nonlocal pending
+            question = next(pending, None)
+            if question is None:
+                pending = iter(questions)
+                question = next(pending)
+            return solve(question)
+
+        generate_s = best_of(lambda: generate(rng), repeat=repeat)
+        solve_s = best_of(solve_next, repeat=repeat)
+        full_s = best_of(lambda: generate_question(question_type, config, 1, rng=rng), repeat=repeat)
+        rows.append({
+            "question_type": question_type,
+            "generate_us": generate_s * 1e6,
+            "solve_us": solve_s * 1e6,
+            "generate_question_us": full_s * 1e6,
+        })
+    return rows
+
+def main():
+    args = parse_args("Question generators and answer solvers per question type")
+    emit("questions", run(args.quick), args.json)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+import threading
+import time
+
+from benchmarks.common import emit, parse_args
+from fake_ollama import start_fake_ollama
+from ollama_client import OllamaClient
+from ollama_sidecar import start_sidecar
+
+#A fleet of AI-mode clients getting the same broadcast question at once, each with its own OllamaClient,
+#straight to a (fake) Ollama that takes 200 ms per reply, 4 at a time, and through ollama_sidecar.py.
+#Counts the requests that reach the model and the time until every client has its answer, for a new
+#question (coalesced in flight) and the same question again (served from the sidecar's cache)
+
+MODEL_DELAY = 0.2
+MODEL_PARALLEL = 4
+QUESTIONS = [
+    "Question 1 (Mathematics):\nWhat is 96 + 49 - 59 - 6 + 34?",
+    "Question 2 (Roman Numerals):\nWhat is the value of MCMXCIV in decimal?",
+]
+
+def ask_everyone(clients: list[OllamaClient], question: str) -> float:
+    start = threading.Barrier(len(clients) + 1)
+    answers = []
+
+    def ask(client: OllamaClient):
+        start.wait()
+        answers.append(client.chat(question, 30.0))
+
+    threads = [threading.Thread(target=ask, args=(client,)) for client in clients]
+    for thread in threads:
+        thread.start()
+    start.wait()
+    started = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    if len(set(answers)) != 1 or None in answers:
+        raise RuntimeError(f"clients got different answers: {set(answers)}")
+    return elapsed
+
+def run(quick: bool = False) -> list[dict]:
+    rows = []
+    for players in ([10, 50] if quick else [10, 50, 100]):
+        model = start_fake_ollama(delay=MODEL_DELAY, parallel=MODEL_PARALLEL)
+        sidecar = start_sidecar(f"127.0.0.1:{model.port}")
+        for route, port in (("direct", model.port), ("sidecar", sidecar.port)):
+            clients = [OllamaClient("127.0.0.1", port, "fake") for _ in range(players)]
+            for case, question in (("new question", QUESTIONS[0]), ("same question again", QUESTIONS[0]),
+                                   ("next question", QUESTIONS[1])):
+                before = model.chats
+                elapsed = ask_everyone(clients, question)
+                rows.append({
+                    "players": players,
+                    "route": route,
+                    "case": case,
+                    "model_requests": model.chats - before,
+                    "all_answered_ms": elapsed * 1e3,
+                })
+            for client in clients:
+                client.close()
+        sidecar.shutdown()
+        model.shutdown()
+    return rows
+
+def main():
+    args = parse_args("Model requests and answer time for many AI-mode clients, direct vs ollama_sidecar.py")
+    emit("sidecar", run(args.quick), args.json)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+import argparse
+import json
+import platform
+import sys
+import time
+from pathlib import Path
+from typing import Any, Callable
+
+#Run benchmarks from the repository root, e.g. python3 -m benchmarks.bench_broadcast
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+def parse_args(description: str) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument("--json", metavar="PATH", help="also write the results as JSON to PATH")
+    parser.add_argument("--quick", action="store_true", help="smaller sizes and fewer repeats")
+    return parser.parse_args()
+
+def best_of(func: Callable[[], Any], repeat: int = 5, min_time: float = 0.05,
+            after: Callable[[], Any] | None = None, max_number: int = 1 << 20) -> float:
+    #Seconds per call: calls are batched until a batch takes min_time, best batch wins
+    #`after` runs untimed after every batch (e.g. draining sockets)
+
+    def run_batch(number: int) -> float:
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        elapsed = time.perf_counter() - start
+        if after is not None:
+            after()
+        return elapsed
+
+    number = 1
+    while True:
+        elapsed = run_batch(number)
+        if elapsed >= min_time or number >= max_number:
+            break
+        number *= 2
+
+    return min(run_batch(number) for _ in range(repeat)) / number
+
+def emit(benchmark: str, rows: list[dict[str, Any]], json_path: str | None = None):
+    columns = list(rows[0].keys()) if rows else []
+    widths = {c: max(len(c), *(len(format_cell(r[c])) for r in rows)) for c in columns}
+
+    print(f"== {benchmark}")
+    print("  ".join(c.ljust(widths[c]) for c in columns))
+    for row in rows:
+        print("  ".join(format_cell(row[c]).ljust(widths[c]) for c in columns))
+
+    if json_path:
+        with open(json_path, "w", encoding="utf-8") as f:
+            json.dump(result_document(benchmark, rows), f, indent=2)
+
+def result_document(benchmark: str, rows: list[dict[str, Any]]) -> dict[str, Any]:
+    return {
+        "benchmark": benchmark,
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "results": rows,
+    }
+
+def format_cell(value: Any) -> str:
+    if value is None:
+        return "-"
+    if isinstance(value, float):
+        return f"{value:.4g}"
+    return str(value)
+
+def load_game_config(**overrides) -> dict[str, Any]:
+    #The shipped server config, with whatever the benchmark needs changed (port, timings, ...)
+    with open(REPO_ROOT / "configs" / "server_config.json", encoding="utf-8") as f:
+        config = json.load(f)
+    config.update(overrides)
+    return config
@@ -0,0 +1,133 @@
+import argparse
+import importlib
+import json
+import platform
+import subprocess
+import sys
+from typing import Any
+
+from benchmarks.common import REPO_ROOT, emit, format_cell
+
+#Runs the whole benchmark suite (or some of it) and writes one JSON document per run, tagged with
+#the commit, so two runs can be compared:
+#
+#  python3 -m benchmarks.run --json before.json
+#  ... change things ...
+#  python3 -m benchmarks.run --json after.json --compare before.json
+
+BENCHMARKS = {
+    "protocol": "benchmarks.bench_protocol",
+    "codecs": "benchmarks.bench_codecs",
+    "broadcast": "benchmarks.bench_broadcast",
+    "questions": "benchmarks.bench_questions",
+    "batch_answers": "benchmarks.bench_batch_answers",
+    "leaderboard": "benchmarks.bench_leaderboard",
+    "game": "benchmarks.bench_game",
+    "ollama": "benchmarks.bench_ollama",
+    "sidecar": "benchmarks.bench_sidecar",
+    "client": "benchmarks.bench_client",
+}
+
+def git_commit() -> str | None:
+    try:
+        result = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT,
+                                capture_output=True, text=True, check=True)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return result.stdout.strip()
+
+def run_suite(names: list[str], quick: bool) -> dict[str, Any]:
+    results = {}
+    for name in names:
+        try:
+            module = importlib.import_module(BENCHMARKS[name])
+        except ImportError as e:
+            # e.g. batch_answers without NumPy
+            print(f"== {name}: skipped ({e})")
+            continue
+        results[name] = module.run(quick)
+        emit(name, results[name])
+        print()
+
+    return {
+        "commit": git_commit(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "quick": quick,
+        "benchmarks": results,
+    }
+
+# === COMPARING RUNS ===
+
+def column_direction(column: str) -> int:
+    #1 if bigger is better, -1 if smaller is better, 0 if the column isn't a measurement
+    if column.endswith("_per_s"):
+        return 1
+    if column.endswith(("_us", "_ms", "_s")):
+        return -1
+    return 0
+
+def row_key(row: dict[str, Any]) -> tuple:
+    #Rows are matched between runs on their parameters: every column that isn't a measurement
+    return tuple((c, v) for c, v in row.items() if column_direction(c) == 0 and not isinstance(v, float))
+
+def compare(old: dict[str, Any], new: dict[str, Any], threshold: float) -> list[dict[str, Any]]:
+    changes = []
+    for name, rows in new["benchmarks"].items():
+        old_rows = {row_key(row): row for row in old["benchmarks"].get(name, [])}
+        for row in rows:
+            old_row = old_rows.get(row_key(row))
+            if old_row is None:
+                continue
+            for column, value in row.items():
+                direction = column_direction(column)
+                before = old_row.get(column)
+                if not direction or not isinstance(value, (int, float)) or not before:
+                    continue
+                ratio = value / before
+                if abs(ratio - 1) < threshold:
+                    continue
+                improved = (ratio > 1) == (direction > 0)
+                changes.append({
+                    "benchmark": name,
+                    "case": " ".join(format_cell(v) for _, v in row_key(row)),
+                    "column": column,
+                    "before": before,
+                    "after": value,
+                    "change": f"{(ratio - 1) * 100:+.1f}%",
+                    "verdict": "better" if improved else "WORSE",
+                })
+    return changes
+
+# --- MAIN
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the benchmark suite")
+    parser.add_argument("names", nargs="*", metavar="BENCHMARK",
+                        help=f"benchmarks to run (default all): {', '.join(BENCHMARKS)}")
+    parser.add_argument("--quick", action="store_true", help="smaller sizes and fewer repeats")
+    parser.add_argument("--json", metavar="PATH", help="write the results as JSON to PATH")
+    parser.add_argument("--compare", metavar="PATH", help="compare with the results of an earlier run")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="smallest relative change reported by --compare (default 0.10)")
+    args = parser.parse_args()
+    unknown = [name for name in args.names if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"unknown benchmark: {', '.join(unknown)}")
+
+    document = run_suite(args.names or list(BENCHMARKS), args.quick)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(document, f, indent=2)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            old = json.load(f)
+        changes = compare(old, document, args.threshold)
+        if changes:
+            emit(f"changes since {old.get('commit') or args.compare}", changes)
+        else:
+            print(f"No changes above {args.threshold:.0%} since {old.get('commit') or args.compare}")
+
+if __name__ == "__main__":
+    main()
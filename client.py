@@ -1,16 +1,19 @@
 #AI Acknowledgement - Artificial Intelligence was used for debugging sometimes, as well as giving me a second opinion on analyzing the possible reasons behind some testcases failing
 
 import json
-import requests
 import sys
 import socket
-import select
+import selectors
 import threading
 from pathlib import Path
 from threading import Event
 from typing import Any, Literal
 from queue import Queue, Empty
 
+from ollama_client import OllamaClient, cache_key, ollama_client_from_config
+from protocol import CODECS, JSON_CODEC, Codec, FrameDecoder, FrameTooLarge
+from solvers import automatic_answer
+
 current_conn: socket.socket | None = None
 listener_thread: threading.Thread | None = None
 
@@ -18,15 +21,29 @@ game_active = False
 awaiting_answer = False
 answer_queue: "Queue[str]" = Queue()
 shutdown_flag = Event()
+
+# request_shutdown() writes a byte here so a listener blocked in select() wakes up at once
+wakeup_reader, wakeup_writer = socket.socketpair()
+wakeup_reader.setblocking(False)
+wakeup_writer.setblocking(False)
+
+READ_SIZE = 1 << 16
 last_answer = ""
 
+preferred_codecs: list[str] = []  # offered in HI, from the "codecs" config key
+codec: Codec = JSON_CODEC  # switched when READY names a codec
+
+session_token: str | None = None  # from READY, sent back in RESUME if the connection drops mid-game
+live_conn: socket.socket | None = None  # socket the listener is using, replaced when a session resumes
+RESUME_ATTEMPTS = 5
+
 # === HANDLE MESSAGES ===
 
 def encode_message(message: dict[str, Any]) -> bytes:
-    return (json.dumps(message) + "\n").encode("utf-8")
+    return codec.encode(message)
 
 def decode_message(data: bytes) -> dict[str, Any]:
-    return json.loads(data.decode("utf-8"))
+    return codec.decode(data)
 
 def send_message(connection: socket.socket, data: dict[str, Any]):
     try:
@@ -34,42 +51,82 @@ def send_message(connection: socket.socket, data: dict[str, Any]):
     except (BrokenPipeError, ConnectionResetError, OSError):
         pass
 
-def receive_message(connection: socket.socket, timeout: float = 2.0) -> dict[str, Any]:
-    buffer = b""
+def request_shutdown():
+    shutdown_flag.set()
+    try:
+        wakeup_writer.send(b"\0")
+    except OSError:
+        pass  # a wakeup is already waiting to be read
+
+def clear_shutdown():
+    #Only the main thread calls this, right before it starts a new session
+    shutdown_flag.clear()
+    drain_wakeup()
+
+def drain_wakeup():
+    try:
+        while wakeup_reader.recv(4096):
+            pass
+    except OSError:
+        pass
+
+def receive_message(connection: socket.socket):
+#Yields messages as they arrive. The socket is read until it has nothing more, then select() blocks until
+#it has data or request_shutdown() is called, so there is no polling. Every read lands in one reusable
+#buffer, up to READ_SIZE bytes at a time
+
+    decoder = FrameDecoder()
+    buffer = bytearray(READ_SIZE)
+    view = memoryview(buffer)
     connection.setblocking(False)
-    while True:
-        if shutdown_flag.is_set() or connection.fileno() == -1:
-            return
-        
+    with selectors.DefaultSelector() as selector:
         try:
-            ready, _, _ = select.select([connection], [], [], timeout)
+            selector.register(connection, selectors.EVENT_READ)
         except (ValueError, OSError):
             return
-        
-        if not ready:
-            continue
+        selector.register(wakeup_reader, selectors.EVENT_READ)
 
-        try:
-            chunk = connection.recv(1024)
-        except (ConnectionResetError, OSError):
-            return
-
-        if not chunk:
-            if buffer.strip():
+        while True:
+            if shutdown_flag.is_set() or connection.fileno() == -1:
+                return
+            try:
+                size = connection.recv_into(buffer)
+            except (BlockingIOError, InterruptedError):
+                # Caught up: sleep until there is more, or until a shutdown is requested
                 try:
-                    yield decode_message(buffer)
-                except Exception:
-                    pass
-            return
-        
-        buffer += chunk
+                    events = selector.select()
+                except (ValueError, OSError):
+                    return
+                if any(key.fileobj is wakeup_reader for key, _ in events):
+                    # Leaves the flag alone, the loop checks it again before reading
+                    drain_wakeup()
+                continue
+            except OSError:
+                return
+
+            if not size:
+                rest = decoder.flush()
+                if rest is not None:
+                    try:
+                        yield decode_message(rest)
+                    except Exception:
+                        pass
+                return
+
+            decoder.feed(view[:size])
 
-        while b"\n" in buffer:
-            raw, _, buffer = buffer.partition(b"\n")
             try:
-                yield decode_message(raw)
-            except json.JSONDecodeError:
-                continue
+                for frame in decoder:
+                    try:
+                        message = decode_message(frame)
+                    except ValueError:
+                        continue
+                    yield message
+                    if decoder.framing != codec.framing:
+                        # READY just switched codecs, the rest of the buffer uses the new framing
+                        decoder.set_framing(codec.framing)
+            except FrameTooLarge:
+                return
 
 # === HANDLE CONNECTIONS ===
 
@@ -81,10 +138,39 @@ def connect(host: str, port: int, username: str) -> socket.socket:
         print("Connection failed")
         sys.exit(1)
     
+    global codec, session_token, live_conn
+    codec = JSON_CODEC
+    session_token = None
+    live_conn = sock
     hi_message = {"message_type": "HI", "username": username}
+    if preferred_codecs:
+        hi_message["codecs"] = preferred_codecs
     send_message(sock, hi_message)
     return sock
 
+def resume(host: str, port: int) -> socket.socket | None:
+    #Reconnects after a dropped connection and takes the seat back with the token from READY,
+    #backing off between attempts. None if the server can't be reached or the user disconnected
+    global codec, live_conn
+    delay = 0.5
+    for _ in range(RESUME_ATTEMPTS):
+        if shutdown_flag.wait(delay):
+            return None
+        delay *= 2
+        try:
+            sock = socket.create_connection((host, port), timeout=delay)
+        except OSError:
+            continue
+
+        codec = JSON_CODEC
+        resume_message = {"message_type": "RESUME", "token": session_token}
+        if preferred_codecs:
+            resume_message["codecs"] = preferred_codecs
+        send_message(sock, resume_message)
+        live_conn = sock
+        return sock
+    return None
+
 def disconnect(connection: socket.socket):
     bye_message = {"message_type": "BYE"}
     try:
@@ -98,14 +184,14 @@ def disconnect(connection: socket.socket):
         pass
     try:
         connection.close()
-        shutdown_flag.set()
+        request_shutdown()
     except OSError:
         pass
 
 # === QUESTION LOGIC AND HELPERS ===
 
 def answer_question(question_type: str, short_question: str, question_text: str, time_limit: float, 
-                    client_mode: Literal["you", "auto", "ai"], ollama_config: dict[str, Any] | None) -> str:
+                    client_mode: Literal["you", "auto", "ai", "hybrid"], ollama: OllamaClient | None) -> str:
     
     if client_mode == "you":
         global awaiting_answer
@@ -122,21 +208,25 @@ def answer_question(question_type: str, short_question: str, question_text: str,
             awaiting_answer = False
 
     elif client_mode == "auto":
-        question_type = question_type.strip().lower()
-        if "mathematics" in question_type:
-            return answer_math(short_question)
-        elif "roman" in question_type:
-            return str(answer_roman(short_question))
-        elif "usable" in question_type:
-            return answer_usable_addresses(short_question)
-        elif "broadcast" in question_type or "network" in question_type:
-            return answer_network_broadcast(short_question)
-        else:
-            return ""
+        return automatic_answer(question_type, short_question)
     
     elif client_mode == "ai":
         try:
-            answer = answer_question_ollama(question_text, time_limit, ollama_config or {})
+            answer = answer_question_ollama(question_text, time_limit, ollama, question_type, short_question)
+        except Exception:
+            answer = ""
+        return answer
+
+    elif client_mode == "hybrid":
+        #Question types the local solvers know never wait for the model
+        try:
+            answer = automatic_answer(question_type, short_question)
+        except Exception:
+            answer = ""
+        if answer:
+            return answer
+        try:
+            answer = answer_question_ollama(question_text, time_limit, ollama, question_type, short_question)
         except Exception:
             answer = ""
         return answer
@@ -145,56 +235,27 @@ def answer_question(question_type: str, short_question: str, question_text: str,
         print("Unknown client mode")
         return ""
 
-def answer_question_ollama(question_text: str, time_limit: float, ollama_config: dict[str, Any]) -> str:
-    
-    host = ollama_config["ollama_host"]
-    port = ollama_config["ollama_port"]
-    model = ollama_config["ollama_model"]
+def answer_question_ollama(question_text: str, time_limit: float, ollama: OllamaClient,
+                           question_type: str | None = None, short_question: str | None = None) -> str:
 
     #ngl this part of this assignment is just so cool, insane props to teaching team y'alls
 
-    ai_prompt = (
-        "ONLY answer the question with the FINAL ANSWER without any greetings, explanation or any kind of fluff. For math questions," 
-        "answer with ONLY the final value. For roman numerals, answer with ONLY the decimal. For a usable IP question, answer with "
-        "ONLY the number of usable IPs. For a network/broadcast question answer with ONLY 'network and broadcast' (eg. 192.168.1.0 and 192.168.1.255)"
-    )
-
-    user_prompt = question_text
-
-    url = f"http://{host}:{port}/api/chat"
+    key = cache_key(question_type, short_question, question_text)
+    if ollama.cache is not None:
+        cached = ollama.cache.get(key)
+        if cached is not None:
+            return cached
 
-    ai_message = {
-        "model": model,
-        "messages": [
-            {"role": "system", "content": ai_prompt},
-            {"role": "user", "content": user_prompt}
-        ],
-        "stream": False
-    }
+    answer = ollama.chat(question_text, time_limit, question_type)
+    if answer and ollama.cache is not None:
+        ollama.cache.put(key, answer)
+    return answer
 
-    result = {"answer": ""}
-
-    def do_request():
-        try:
-            r = requests.post(url, json=ai_message, timeout=time_limit)
-            r.raise_for_status()
-            data = r.json()
-            result["answer"] = (data.get("message", {}).get("content") or "")
-        except Exception:
-            result["answer"] = None
-
-    worker = threading.Thread(target=do_request, daemon=True)
-    worker.start()
-    worker.join(timeout=time_limit)
-
-    if worker.is_alive():
-        return None
-    return result["answer"]
-
-def get_ollama_configs(config: dict[str, Any]) -> dict[str, Any] | None:
+def get_ollama_configs(config: dict[str, Any]) -> OllamaClient | None:
+#The one Ollama client (and connection pool) every question of this run goes through
 
     mode = config.get("client_mode", "").strip().lower()
-    if mode != "ai":
+    if mode not in ("ai", "hybrid"):
         return None
     
     ollama_config = config.get("ollama_config")
@@ -202,88 +263,11 @@ def get_ollama_configs(config: dict[str, Any]) -> dict[str, Any] | None:
         print("client.py: Missing values for Ollama configuration", file=sys.stderr)
         sys.exit(1)
 
-    return ollama_config
-
-def automatic_answer(question_type: str, short_question: str) -> str:
-
-    question_type = question_type.strip().lower()
-    if "mathematics" in question_type:
-        return answer_math(short_question)
-    elif "roman" in question_type:
-        return str(answer_roman(short_question))
-    elif "usable" in question_type:
-        return answer_usable_addresses(short_question)
-    elif "broadcast" in question_type or "network" in question_type:
-        return answer_network_broadcast(short_question)
-    else:
-        return ""
-
-def answer_math(expr: str) -> str:
-
-    tokens = expr.split()   
-    total = int(tokens[0])
-    i = 1
-
-    while i < len(tokens):
-        operator = tokens[i]
-        operand = int(tokens[i + 1])
-        if operator == '+':
-            total += operand
-        elif operator == '-':
-            total -= operand
-        i += 2
-
-    return str(total)
-
-def answer_roman(s: str) -> str:
-
-    vals = {
-        'I': 1, 'V': 5, 'X': 10, 'L': 50,
-        'C': 100, 'D': 500, 'M': 1000
-    }
-
-    total = 0
-    prev_value = 0
-    for char in reversed(s):
-        value = vals[char]
-        if value < prev_value:
-            total -= value
-        else:
-            total += value
-        prev_value = value
-    return str(total)
-
-def answer_usable_addresses(subnet: str) -> str:
-
-    _, prefix = subnet.split('/')
-    prefix = int(prefix)
-    total_addresses = 2 ** (32 - prefix)
-    usable_addresses = max(total_addresses -2, 0)
-    return str(usable_addresses)
-
-def ip_to_int(ip_str: str) -> int:
-
-    parts = [int(part) for part in ip_str.split('.')]
-    n = (parts[0] << 24) + (parts[1] << 16) + (parts[2] << 8) + parts[3]
-    return n
-
-def int_to_ip(n: int) -> str:
-
-    return f"{(n >> 24) & 255}.{(n >> 16) & 255}.{(n >> 8) & 255}.{n & 255}"
-
-def answer_network_broadcast(subnet: str) -> str:
-
-    ip_str, prefix = subnet.split('/')
-    prefix = int(prefix)
-    ip_int = ip_to_int(ip_str)
-    mask = (0xFFFFFFFF << (32 - prefix)) & 0xFFFFFFFF
-    network = ip_int & mask
-    broadcast = network | (~mask & 0xFFFFFFFF)
-    return f"{int_to_ip(network)} and {int_to_ip(broadcast)}"
+    return ollama_client_from_config(ollama_config)
 
 # === HANDLE MESSAGES ===
 
-def handle_question(message: dict[str, Any], connection: socket.socket, client_mode: Literal["you", "auto", "ai"], ollama_config: dict[str, Any] | None):
+def handle_question(message: dict[str, Any], connection: socket.socket, client_mode: Literal["you", "auto", "ai", "hybrid"], ollama: OllamaClient | None):
 
     global last_answer
     question_text = message.get("question") or message.get("trivia_question", "")
@@ -293,7 +277,7 @@ def handle_question(message: dict[str, Any], connection: socket.socket, client_m
 
     print(question_text)
 
-    answer = answer_question(question_type, short_question, question_text, time_limit, client_mode, ollama_config)
+    answer = answer_question(question_type, short_question, question_text, time_limit, client_mode, ollama)
     last_answer = answer
 
     if answer is not None:
@@ -302,17 +286,20 @@ def handle_question(message: dict[str, Any], connection: socket.socket, client_m
                     "answer": answer
                 })
 
-def handle_received_message(message: dict[str, Any], connection: socket.socket, client_mode: Literal["you", "auto", "ai"], ollama_config):
+def handle_received_message(message: dict[str, Any], connection: socket.socket, client_mode: Literal["you", "auto", "ai", "hybrid"], ollama):
 
-    global game_active
+    global game_active, codec, session_token
     message_type = message.get("message_type", "").strip().upper()
 
     if message_type == "READY":
         game_active = True
+        if "codec" in message:
+            codec = CODECS.get(message["codec"], JSON_CODEC)
+        session_token = message.get("token")
         print(message["info"])
 
     elif message_type == "QUESTION":
-        handle_question(message, connection, client_mode, ollama_config)
+        handle_question(message, connection, client_mode, ollama)
 
     elif message_type == "RESULT":
         if last_answer.strip() != "":
@@ -331,17 +318,17 @@ def handle_received_message(message: dict[str, Any], connection: socket.socket,
             pass
  
         disconnect(connection)
-        shutdown_flag.set()
+        request_shutdown()
 
     else:
         print("Received:", message)
 
-def listener(sock, client_mode, ollama_config):
-    run_client_session(sock, client_mode, ollama_config)
+def listener(sock, client_mode, ollama, address):
+    run_client_session(sock, client_mode, ollama, address)
 
 # === HANDLE MAIN SESSION LOOP ===
 
-def handle_command(command: str, username: str, client_mode: str, ollama_config,
+def handle_command(command: str, username: str, client_mode: str, ollama,
                    current_conn: socket.socket | None, listener_thread: threading.Thread | None):
     
     parts = command.strip().split()
@@ -355,10 +342,14 @@ def handle_command(command: str, username: str, client_mode: str, ollama_config,
             print("Already connected.")
             return current_conn, listener_thread
         try:
-            shutdown_flag.clear()
+            clear_shutdown()
             host, port_str = parts[1].split(":")
             sock = connect(host, int(port_str), username)
-            lt = threading.Thread(target=listener, args=(sock, client_mode, ollama_config), daemon=True)
+            if ollama is not None:
+                # Opens the pooled connection and loads the model while the lobby fills up
+                ollama.warmup_in_background()
+            lt = threading.Thread(target=listener, args=(sock, client_mode, ollama, (host, int(port_str))),
+                                  daemon=True)
             lt.start()
             return sock, lt
         except ValueError:
@@ -366,8 +357,8 @@ def handle_command(command: str, username: str, client_mode: str, ollama_config,
 
     elif command == "DISCONNECT":
         if current_conn:
-            shutdown_flag.set()
-            disconnect(current_conn)  #If connected, sends bye
+            request_shutdown()
+            disconnect(live_conn or current_conn)  #If connected, sends bye
             if listener_thread:
                 listener_thread.join(timeout=0.5)
             #print("Disconnected.")
@@ -377,8 +368,8 @@ def handle_command(command: str, username: str, client_mode: str, ollama_config,
 
     elif command == "EXIT":
         if current_conn:
-            shutdown_flag.set()
-            disconnect(current_conn) #If connected, send bye, exit program
+            request_shutdown()
+            disconnect(live_conn or current_conn) #If connected, send bye, exit program
             if listener_thread:
                 listener_thread.join(timeout=0.5)
         sys.exit(0)
@@ -387,20 +378,34 @@ def handle_command(command: str, username: str, client_mode: str, ollama_config,
         #Invalid COmmand
         return current_conn, listener_thread
 
-def run_client_session(sock: socket.socket, client_mode: str, ollama_config):
+def run_client_session(sock: socket.socket, client_mode: str, ollama, address: tuple[str, int]):
 
-    finished = False
-    try:
-        for message in receive_message(sock):  
-            if shutdown_flag.is_set() or sock.fileno() == -1:
-                break
-            handle_received_message(message, sock, client_mode, ollama_config)
-            msg_type = message.get("message_type", "").strip().upper()
-            if msg_type == "FINISHED":
-                finished = True
-                break
-    except (ValueError, OSError):
-        pass
+    global game_active
+    while True:
+        try:
+            for message in receive_message(sock):  
+                if shutdown_flag.is_set() or sock.fileno() == -1:
+                    break
+                handle_received_message(message, sock, client_mode, ollama)
+                msg_type = message.get("message_type", "").strip().upper()
+                if msg_type == "FINISHED":
+                    return
+        except (ValueError, OSError):
+            pass
+
+        # Dropped mid-game: reconnect and resume, unless the user left or the last resume was refused
+        if shutdown_flag.is_set() or not game_active or session_token is None:
+            return
+        game_active = False  # back on once the server answers with READY
+        print("Connection lost, reconnecting...")
+        try:
+            sock.close()
+        except OSError:
+            pass
+        sock = resume(*address)
+        if sock is None:
+            print("Could not reconnect.")
+            return
 
 def main():
 
@@ -418,10 +423,12 @@ def main():
     
     username = config["username"]
     client_mode = config["client_mode"]
-    if client_mode == "ai":
-        ollama_config = get_ollama_configs(config)
+    global preferred_codecs
+    preferred_codecs = [name for name in config.get("codecs", []) if name in CODECS]
+    if client_mode in ("ai", "hybrid"):
+        ollama = get_ollama_configs(config)
     else:
-        ollama_config = None
+        ollama = None
 
     current_conn = None
     listener_thread = None
@@ -432,7 +439,8 @@ def main():
             line = input("")
         except EOFError:
             if current_conn:
-                disconnect(current_conn)
+                request_shutdown()
+                disconnect(live_conn or current_conn)
             break
 
         upper = line.upper()
@@ -440,7 +448,7 @@ def main():
         #Priority to commands
         if upper in ("EXIT", "DISCONNECT") or upper.startswith("CONNECT"):
             current_conn, listener_thread = handle_command(
-                line, username, client_mode, ollama_config,
+                line, username, client_mode, ollama,
                 current_conn, listener_thread
             )
             continue
@@ -0,0 +1,241 @@
+import argparse
+import json
+import sys
+import threading
+import time
+from collections import deque
+from typing import Any
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+from latency import latency_stats
+from leaderboard import Leaderboard
+
+#Append-only JSON-lines log of what happens in every game, and a replay tool that rebuilds
+#standings and timing from it
+#
+#record() only appends a dict to a deque, so the game loop never waits on the disk: a background
+#thread serializes and writes whatever has piled up every FLUSH_INTERVAL seconds. If the writer falls
+#MAX_BACKLOG events behind, new events are dropped and counted instead of growing memory without bound.
+#
+#Every line has "t" (seconds since the log was opened, monotonic clock), "event" and "room".
+#  log          wall-clock "time" the log was opened, first line of every run
+#  game_start   seed, question_types, question_seconds, scoring_mode, points nouns
+#  handshake    player ("host:port"), username, codec
+#  question     n, question_type, short_question, time_limit, players
+#  answer       player, n, answer, correct, points, latency
+#  score        player, delta, score
+#  disconnect   player
+#  resume       player, address (where it reconnected from)
+#  game_end
+
+FLUSH_INTERVAL = 0.2
+MAX_BACKLOG = 1_000_000
+
+class EventLog:
+
+    def __init__(self, path: str):
+        self.path = path
+        self.file = open(path, "ab")
+        self.started = time.monotonic()
+        self.pending: deque[dict[str, Any]] = deque()
+        self.dropped = 0
+        self.stopping = threading.Event()
+        self.writer = threading.Thread(target=self.write_loop, name="event-log", daemon=True)
+        self.writer.start()
+        self.record("log", 0, time=time.time())
+
+    def record(self, event: str, room: int, **fields):
+        if len(self.pending) >= MAX_BACKLOG:
+            self.dropped += 1
+            return
+        fields["t"] = round(time.monotonic() - self.started, 6)
+        fields["event"] = event
+        fields["room"] = room
+        self.pending.append(fields)
+
+    def write_loop(self):
+        while not self.stopping.wait(FLUSH_INTERVAL):
+            self.write_pending()
+        self.write_pending()
+
+    def write_pending(self):
+        if not self.pending:
+            return
+        lines = []
+        while self.pending:
+            lines.append(encode_event(self.pending.popleft()))
+        if self.dropped:
+            lines.append(encode_event({"t": round(time.monotonic() - self.started, 6), "event": "dropped",
+                                       "room": 0, "count": self.dropped}))
+            self.dropped = 0
+        self.file.write(b"".join(lines))
+        self.file.flush()
+
+    def close(self):
+        self.stopping.set()
+        self.writer.join()
+        self.file.close()
+
+def encode_event(event: dict[str, Any]) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(event, option=orjson.OPT_APPEND_NEWLINE)
+    return (json.dumps(event, separators=(",", ":")) + "\n").encode("utf-8")
+
+def decode_event(line: bytes) -> dict[str, Any]:
+    if orjson is not None:
+        return orjson.loads(line)
+    return json.loads(line)
+
+# The log the servers write to, if "event_log_path" is set
+active: EventLog | None = None
+
+def open_event_log(config: dict[str, Any], prog: str = "server.py"):
+    global active
+    path = config.get("event_log_path")
+    if not path:
+        return
+    try:
+        active = EventLog(path)
+    except OSError as e:
+        print(f"{prog}: Could not open event log: {e}", file=sys.stderr)
+        sys.exit(1)
+
+def record(event: str, room: int = 1, **fields):
+    if active is not None:
+        active.record(event, room, **fields)
+
+def close_event_log():
+    global active
+    if active is not None:
+        active.close()
+        active = None
+
+def player_id(addr) -> str:
+    return f"{addr[0]}:{addr[1]}"
+
+def game_fields(seed: int, config: dict[str, Any]) -> dict[str, Any]:
+    return {
+        "seed": seed,
+        "question_types": config["question_types"],
+        "question_seconds": config["question_seconds"],
+        "scoring_mode": config.get("scoring_mode", "correct"),
+        "points_noun_singular": config["points_noun_singular"],
+        "points_noun_plural": config["points_noun_plural"],
+    }
+
+# === REPLAY ===
+
+class ReplayedGame:
+#One room's game rebuilt from its events
+
+    def __init__(self, room: int, started: dict[str, Any]):
+        self.room = room
+        self.config = started
+        self.board = Leaderboard()
+        self.started_at = started["t"]
+        self.ended_at: float | None = None
+        self.questions: dict[int, dict[str, Any]] = {}
+        self.latencies: dict[int, list[float]] = {}
+        self.correct: dict[int, int] = {}
+        self.disconnects = 0
+        self.resumes = 0
+        self.standings_after: dict[int, list[str]] = {}
+
+def replay(lines, every_question: bool = False) -> list[ReplayedGame]:
+    #Games in the order they started; one log may hold several runs and several rooms
+    games: list[ReplayedGame] = []
+    running: dict[int, ReplayedGame] = {}
+    joined: dict[int, dict[str, str]] = {}  # room -> player -> username, before the game starts
+
+    for line in lines:
+        if not line.strip():
+            continue
+        event = decode_event(line)
+        kind = event["event"]
+        room = event["room"]
+        game = running.get(room)
+
+        if kind == "log":
+            running.clear()
+            joined.clear()
+        elif kind == "handshake":
+            joined.setdefault(room, {})[event["player"]] = event["username"]
+        elif kind == "game_start":
+            game = running[room] = ReplayedGame(room, event)
+            for player, username in joined.pop(room, {}).items():
+                game.board.add(player, username)
+            games.append(game)
+        elif game is None:
+            if kind == "disconnect":
+                joined.get(room, {}).pop(event["player"], None)  # left the lobby before the game started
+            continue
+        elif kind == "question":
+            if every_question and game.questions:
+                game.standings_after[max(game.questions)] = game.board.lines(game.config)
+            game.questions[event["n"]] = event
+            game.latencies[event["n"]] = []
+            game.correct[event["n"]] = 0
+        elif kind == "answer":
+            game.latencies[event["n"]].append(event["latency"])
+            game.correct[event["n"]] += bool(event["correct"])
+        elif kind == "score":
+            if event["player"] in game.board:
+                game.board.update(event["player"], event["delta"])
+        elif kind == "disconnect":
+            game.disconnects += 1
+        elif kind == "resume":
+            game.resumes += 1
+        elif kind == "game_end":
+            game.ended_at = event["t"]
+            running.pop(room, None)
+    return games
+
+def print_game(game: ReplayedGame, every_question: bool):
+    config = game.config
+    duration = "unfinished" if game.ended_at is None else f"{game.ended_at - game.started_at:.2f}s"
+    print(f"== room {game.room}, seed {config.get('seed')}, {len(game.board)} players, "
+          f"{len(game.questions)} questions, {game.disconnects} disconnects, {game.resumes} resumes, {duration}")
+    for n, question in sorted(game.questions.items()):
+        stats = latency_stats(game.latencies[n])
+        timing = ""
+        if stats["count"]:
+            timing = f", p50 {stats['p50_ms']:.1f} ms, p99 {stats['p99_ms']:.1f} ms, max {stats['max_ms']:.1f} ms"
+        print(f"Question {n} ({question['question_type']}: {question['short_question']}) at "
+              f"{question['t'] - game.started_at:.2f}s: {stats['count']}/{question['players']} answered, "
+              f"{game.correct[n]} correct{timing}")
+        if every_question and n in game.standings_after:
+            print("  " + "\n  ".join(game.standings_after[n]))
+    print("Final standings:")
+    print("\n".join(game.board.lines(config)))
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a server event log")
+    parser.add_argument("log", help="event log written with event_log_path")
+    parser.add_argument("--room", type=int, help="only this room")
+    parser.add_argument("--every-question", action="store_true", help="show the standings after every question")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    try:
+        with open(args.log, "rb") as f:
+            games = replay(f, args.every_question)
+    except OSError as e:
+        print(f"event_log.py: {e}", file=sys.stderr)
+        sys.exit(1)
+    except (ValueError, KeyError) as e:
+        print(f"event_log.py: {args.log} is not a valid event log ({e})", file=sys.stderr)
+        sys.exit(1)
+    elapsed = time.perf_counter() - started
+
+    for game in games:
+        if args.room is None or game.room == args.room:
+            print_game(game, args.every_question)
+            print()
+    print(f"Replayed {len(games)} games in {elapsed * 1000:.1f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+import argparse
+import json
+import re
+import threading
+import time
+from typing import Any
+
+from http_service import KeepAliveHandler, KeepAliveServer, serve_in_background
+from solvers import automatic_answer, normalize_question_type
+
+#Stand-in for an Ollama server, enough of /api/chat for the client's "ai" mode, for trying the client and
+#benchmarking it without a model. It answers trivia questions correctly with the same solvers as auto mode,
+#after a configurable "thinking" delay, and keeps connections alive like Ollama does. Requests with
+#"stream": true get the reply as an NDJSON stream of small chunks, `token_delay` seconds apart, and
+#`chatter` wraps the answer in a sentence and a long explanation, like a model that ignores the prompt; its
+#arithmetic comes with the working, "96 + 49 = 145".
+#`parallel` caps how many replies are generated at once (Ollama's OLLAMA_NUM_PARALLEL), the rest queue.
+#
+#  python3 fake_ollama.py --port 11434 --delay 300 --token-delay 20 --chatter --parallel 4
+
+# Pulls the short question back out of the formatted trivia question, per question type
+SHORT_QUESTION_PATTERNS = {
+    "Mathematics": re.compile(r"\d+(?: [+-] \d+)*"),
+    "Roman Numerals": re.compile(r"\b[MDCLXVI]+\b"),
+    "Usable IP Addresses of a Subnet": re.compile(r"\d+\.\d+\.\d+\.\d+/\d+"),
+    "Network and Broadcast Address of a Subnet": re.compile(r"\d+\.\d+\.\d+\.\d+/\d+"),
+}
+QUESTION_HEADER = re.compile(r"\((.+?)\):")
+CHUNK_SIZE = 3  # characters per streamed chunk, numbers and addresses arrive split across chunks
+EXPLANATION = " ".join(["To work this out, take the question one step at a time and check every step."] * 8)
+
+def fake_answer(question_text: str, chatter: bool = False) -> str:
+    header = QUESTION_HEADER.search(question_text)
+    question_type = normalize_question_type(header.group(1)) if header else None
+    match = SHORT_QUESTION_PATTERNS[question_type].search(question_text[header.end():]) if question_type else None
+    if match is None:
+        answer = "I don't know."
+    else:
+        answer = automatic_answer(question_type, match.group(0))
+    if not chatter:
+        return answer
+    if match is not None and question_type == "Mathematics":
+        return f"{match.group(0)} = {answer}.\n\n{EXPLANATION}"
+    return f"The answer is {answer}.\n\n{EXPLANATION}"
+
+class FakeOllamaHandler(KeepAliveHandler):
+
+    def do_GET(self):
+        if self.path == "/":
+            self.send_body(200, b"Ollama is running", "text/plain; charset=utf-8")
+        else:
+            self.send_error(404)
+
+    def do_POST(self):
+        if self.path != "/api/chat":
+            self.send_error(404)
+            return
+        try:
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+        except ValueError:
+            self.send_error(400)
+            return
+
+        self.server.requests += 1
+        messages = request.get("messages") or []
+        if not messages:
+            # Ollama only loads the model for a chat without messages
+            self.send_json({"model": request.get("model"), "message": {"role": "assistant", "content": ""},
+                            "done_reason": "load", "done": True})
+            return
+
+        self.server.chats += 1
+        reply = fake_answer(messages[-1].get("content", ""), self.server.chatter)
+        chunks = [reply[i:i + CHUNK_SIZE] for i in range(0, len(reply), CHUNK_SIZE)]
+        if self.server.slots is not None:
+            with self.server.slots:
+                time.sleep(self.server.delay)
+        else:
+            time.sleep(self.server.delay)
+
+        if request.get("stream", True):
+            self.stream_reply(request.get("model"), chunks)
+            return
+        time.sleep(self.server.token_delay * len(chunks))
+        self.send_json({"model": request.get("model"), "message": {"role": "assistant", "content": reply},
+                        "done_reason": "stop", "done": True})
+
+    def stream_reply(self, model: str, chunks: list[str]):
+        #Like Ollama: one JSON object per line, chunked transfer encoding, a final "done" line
+        lines = [{"model": model, "message": {"role": "assistant", "content": chunk}, "done": False} for chunk in chunks]
+        lines.append({"model": model, "message": {"role": "assistant", "content": ""}, "done_reason": "stop",
+                      "done": True})
+        try:
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            for number, line in enumerate(lines):
+                if number:
+                    time.sleep(self.server.token_delay)
+                data = json.dumps(line).encode("utf-8") + b"\n"
+                self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            self.server.cancelled += 1  # the client stopped reading, like a client that has its answer
+            self.close_connection = True
+
+    def send_json(self, body: dict[str, Any]):
+        self.send_body(200, json.dumps(body).encode("utf-8"), "application/json; charset=utf-8")
+
+class FakeOllama(KeepAliveServer):
+#Counts what the client under test did to it: connections opened, requests, chats and abandoned streams
+
+    def __init__(self, port: int = 0, delay: float = 0.0, token_delay: float = 0.0, chatter: bool = False,
+                 parallel: int = 0):
+        super().__init__(("127.0.0.1", port), FakeOllamaHandler)
+        self.delay = delay
+        self.slots = threading.Semaphore(parallel) if parallel > 0 else None
+        self.token_delay = token_delay
+        self.chatter = chatter
+        self.cancelled = 0  # streams the client closed before the end
+        self.connections = 0
+        self.requests = 0
+        self.chats = 0
+
+    def process_request(self, request, client_address):
+        self.connections += 1
+        super().process_request(request, client_address)
+
+def start_fake_ollama(port: int = 0, delay: float = 0.0, token_delay: float = 0.0, chatter: bool = False,
+                      parallel: int = 0) -> FakeOllama:
+    #For benchmarks: the model stand-in runs alongside the client being measured
+    return serve_in_background(FakeOllama(port, delay, token_delay, chatter, parallel), "fake-ollama")
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake Ollama /api/chat server for the client's ai mode")
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument("--delay", type=float, default=0, help="ms to 'think' before every answer")
+    parser.add_argument("--token-delay", type=float, default=0, help="ms between streamed chunks")
+    parser.add_argument("--chatter", action="store_true", help="wrap answers in a sentence and an explanation")
+    parser.add_argument("--parallel", type=int, default=0, help="replies generated at once (default unlimited)")
+    args = parser.parse_args()
+
+    server = FakeOllama(args.port, args.delay / 1000, args.token_delay / 1000, args.chatter, args.parallel)
+    print(f"Fake Ollama on http://127.0.0.1:{server.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
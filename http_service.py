@@ -0,0 +1,41 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+#Plumbing for the small HTTP servers that speak Ollama's API (fake_ollama.py, ollama_sidecar.py)
+#Ollama keeps connections alive and answers with TCP_NODELAY set, and the pooled OllamaClient relies on the
+#first, so these servers do both. They are built to run beside a load test, from a daemon thread, without
+#writing a log line per request.
+
+class KeepAliveHandler(BaseHTTPRequestHandler):
+
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def send_body(self, status: int, body: bytes, content_type: str):
+        try:
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True  # the client gave up waiting
+
+    def log_message(self, format, *args):
+        pass
+
+class KeepAliveServer(ThreadingHTTPServer):
+#One thread per connection; every AI-mode client of a game connects within the same moment, so the listen
+#backlog is far above socketserver's default of 5
+
+    daemon_threads = True
+    request_queue_size = 1024
+
+    @property
+    def port(self) -> int:
+        return self.server_address[1]
+
+def serve_in_background(server: KeepAliveServer, name: str) -> KeepAliveServer:
+    #Bound with port 0, .port says which free port the OS picked
+    threading.Thread(target=server.serve_forever, name=name, daemon=True).start()
+    return server
@@ -0,0 +1,21 @@
+import math
+
+#Latency summaries shared by the servers' game summary, the event log replay and loadgen.py
+
+def percentile(ordered: list[float], fraction: float) -> float:
+    #Nearest rank on an already sorted list
+    index = max(math.ceil(fraction * len(ordered)) - 1, 0)
+    return ordered[index]
+
+def latency_stats(latencies: list[float]) -> dict[str, float | int]:
+    ordered = sorted(latencies)
+    if not ordered:
+        return {"count": 0}
+    return {
+        "count": len(ordered),
+        "mean_ms": round(sum(ordered) / len(ordered) * 1000, 3),
+        "p50_ms": round(percentile(ordered, 0.50) * 1000, 3),
+        "p90_ms": round(percentile(ordered, 0.90) * 1000, 3),
+        "p99_ms": round(percentile(ordered, 0.99) * 1000, 3),
+        "max_ms": round(ordered[-1] * 1000, 3),
+    }
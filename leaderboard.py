@@ -0,0 +1,205 @@
+from typing import Any, Hashable, Iterator
+
+#Standings kept per score instead of re-sorting every player per question
+#
+#Players with the same score share a bucket, and a Fenwick tree over score values counts players per score,
+#so "how many players are ahead of this one" is O(log max_score). A score change only moves the player
+#between two buckets; the tree is brought up to date from the bucket sizes on the next read, one add per
+#score whose count changed rather than per answer. Ties are broken by (username, player id), the order the
+#full sort always used: players are put in that order once, when the field changes, and a bucket is sorted
+#by it only when its rows are read. Rows walk the buckets from the top and skip whole buckets before the
+#first row wanted, so the top K never touches the rest of the field.
+
+Row = tuple[int, str, int]  # (rank, username, score)
+
+class ScoreCounts:
+#Fenwick tree of how many players have each score; scores are the servers' points, never negative
+
+    def __init__(self, size: int = 64):
+        self.tree = [0] * (size + 1)
+        self.counts: dict[int, int] = {}
+
+    def set(self, score: int, count: int):
+        delta = count - self.counts.get(score, 0)
+        if not delta:
+            return
+        if score < 0:
+            raise ValueError(f"negative score {score}")
+        if count:
+            self.counts[score] = count
+        else:
+            del self.counts[score]
+        tree = self.tree
+        size = len(tree) - 1
+        if score >= size:
+            self.grow(score)
+            return
+        i = score + 1
+        while i <= size:
+            tree[i] += delta
+            i += i & -i
+
+    def grow(self, score: int):
+        size = len(self.tree) - 1
+        while size <= score:
+            size *= 2
+        counts = self.counts
+        self.__init__(size)
+        for score, count in counts.items():
+            self.set(score, count)
+
+    def at_most(self, score: int) -> int:
+        tree = self.tree
+        i = min(score + 1, len(tree) - 1)
+        total = 0
+        while i > 0:
+            total += tree[i]
+            i -= i & -i
+        return total
+
+class Leaderboard:
+
+    def __init__(self):
+        self.scores: dict[Hashable, int] = {}
+        self.usernames: dict[Hashable, str] = {}
+        self.buckets: dict[int, set[Hashable]] = {}
+        self.counts = ScoreCounts()
+        self.ordinals: dict[Hashable, int] = {}  # player -> place in (username, player) order
+        self.field_changed = False  # players joined or left since ordinals were made
+        self.stale = False  # scores changed since counts, descending and sorted were brought up to date
+        self.descending: list[int] = []  # non-empty scores, highest first
+        self.sorted: dict[int, list[Hashable]] = {}  # score -> its bucket in tie order, once read
+
+    def __len__(self) -> int:
+        return len(self.scores)
+
+    def __contains__(self, player: Hashable) -> bool:
+        return player in self.scores
+
+    def add(self, player: Hashable, username: str, score: int = 0):
+        if player in self.scores:
+            self.remove(player)
+        self.usernames[player] = username
+        self.insert(player, score)
+        self.field_changed = True
+
+    def discard(self, player: Hashable):
+        if player in self.scores:
+            self.remove(player)
+            del self.usernames[player]
+            self.field_changed = True
+
+    def update(self, player: Hashable, points: int):
+        #Called once per answer, so it moves the player itself instead of going through remove/insert
+        if not points:
+            return
+        scores = self.scores
+        buckets = self.buckets
+        old = scores[player]
+        score = scores[player] = old + points
+        bucket = buckets[old]
+        bucket.discard(player)
+        if not bucket:
+            del buckets[old]
+        bucket = buckets.get(score)
+        if bucket is None:
+            bucket = buckets[score] = set()
+        bucket.add(player)
+        self.stale = True
+
+    def insert(self, player: Hashable, score: int):
+        self.scores[player] = score
+        bucket = self.buckets.get(score)
+        if bucket is None:
+            bucket = self.buckets[score] = set()
+        bucket.add(player)
+        self.stale = True
+
+    def remove(self, player: Hashable):
+        score = self.scores.pop(player)
+        bucket = self.buckets[score]
+        bucket.discard(player)
+        if not bucket:
+            del self.buckets[score]
+        self.stale = True
+
+    def score(self, player: Hashable) -> int:
+        return self.scores[player]
+
+    def refresh(self):
+        if self.field_changed:
+            usernames = self.usernames
+            by_name = sorted(self.scores, key=lambda player: (usernames[player], player))
+            self.ordinals = {player: i for i, player in enumerate(by_name)}
+            self.field_changed = False
+            self.sorted.clear()
+        if self.stale:
+            counts = self.counts
+            for score in [score for score in counts.counts if score not in self.buckets]:
+                counts.set(score, 0)
+            for score, bucket in self.buckets.items():
+                counts.set(score, len(bucket))
+            self.descending = sorted(self.buckets, reverse=True)
+            self.sorted.clear()
+            self.stale = False
+
+    def bucket(self, score: int) -> list[Hashable]:
+        #Players with `score` in tie order
+        order = self.sorted.get(score)
+        if order is None:
+            order = self.sorted[score] = sorted(self.buckets[score], key=self.ordinals.__getitem__)
+        return order
+
+    def rank(self, player: Hashable) -> int:
+        #Competition ranking: 1 + number of players with a strictly higher score
+        self.refresh()
+        return 1 + len(self.scores) - self.counts.at_most(self.scores[player])
+
+    def standings(self) -> list[Hashable]:
+        self.refresh()
+        order = []
+        for score in self.descending:
+            order.extend(self.bucket(score))
+        return order
+
+    def top_score(self) -> int | None:
+        self.refresh()
+        return self.descending[0] if self.descending else None
+
+    def leaders(self) -> list[Hashable]:
+        top = self.top_score()
+        return [] if top is None else list(self.bucket(top))
+
+    def spans(self, start: int = 0, stop: int | None = None) -> Iterator[tuple[int, int, list[Hashable]]]:
+        #(rank, score, players) for every bucket holding a position in [start, stop), cut to that range
+        self.refresh()
+        if stop is None or stop > len(self.scores):
+            stop = len(self.scores)
+        position = 0
+        for score in self.descending:
+            if position >= stop:
+                return
+            size = len(self.buckets[score])
+            if position + size > start:
+                order = self.bucket(score)
+                yield position + 1, score, order[max(start - position, 0):stop - position]
+            position += size
+
+    def rows(self, start: int = 0, stop: int | None = None) -> Iterator[Row]:
+        #Standings rows for positions [start, stop)
+        usernames = self.usernames
+        for rank, score, players in self.spans(start, stop):
+            for player in players:
+                yield rank, usernames[player], score
+
+    def lines(self, config: dict[str, Any], start: int = 0, stop: int | None = None) -> list[str]:
+        #LEADERBOARD text lines for positions [start, stop), "rank. username: score points", built a bucket at
+        #a time: every row of a bucket shares its rank and score, only the username differs
+        usernames = self.usernames
+        lines = []
+        for rank, score, players in self.spans(start, stop):
+            noun = config["points_noun_singular"] if score == 1 else config["points_noun_plural"]
+            prefix = f"{rank}. "
+            suffix = f": {score} {noun}"
+            lines.extend([prefix + usernames[player] + suffix for player in players])
+        return lines
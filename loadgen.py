@@ -0,0 +1,254 @@
+import argparse
+import asyncio
+import json
+import random
+import socket
+import sys
+import time
+from typing import Any, Callable
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+from latency import latency_stats
+from protocol import CODECS, JSON_CODEC, Codec, FrameDecoder, FrameTooLarge, read_frame
+from solvers import automatic_answer
+
+#Load generator: N simulated auto-mode players from one process, one asyncio task each
+#Every bot answers with the same solvers as `client.py` in auto mode, after a delay drawn from a
+#configurable distribution, and may answer wrong or drop out on purpose. The report covers answer
+#throughput and QUESTION -> RESULT round trips as seen by the players.
+#
+#  python3 loadgen.py --port 7777 --players 2000 --delay exp:200 --error-rate 0.1
+
+# === DISTRIBUTIONS ===
+
+def parse_distribution(spec: str) -> Callable[[random.Random], float]:
+    #"fixed:MS", "uniform:LOW:HIGH", "exp:MEAN" or "normal:MEAN:STDDEV", all in milliseconds
+    #Returns a function giving a delay in seconds, never negative
+    name, _, params = spec.partition(":")
+    try:
+        values = [float(v) / 1000 for v in params.split(":")] if params else []
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid distribution '{spec}'")
+
+    if name == "fixed" and len(values) == 1:
+        return lambda rng: values[0]
+    if name == "uniform" and len(values) == 2:
+        return lambda rng: rng.uniform(values[0], values[1])
+    if name == "exp" and len(values) == 1:
+        return lambda rng: rng.expovariate(1 / values[0]) if values[0] > 0 else 0.0
+    if name == "normal" and len(values) == 2:
+        return lambda rng: max(rng.gauss(values[0], values[1]), 0.0)
+    raise argparse.ArgumentTypeError(f"invalid distribution '{spec}'")
+
+def probability(text: str) -> float:
+    value = float(text)
+    if not 0 <= value <= 1:
+        raise argparse.ArgumentTypeError("must be between 0 and 1")
+    return value
+
+# === BOTS ===
+
+class Stats:
+#Counters shared by every bot; asyncio runs one bot at a time so plain attributes are safe
+
+    def __init__(self):
+        self.connected = 0
+        self.connect_failures = 0
+        self.ready = 0
+        self.finished = 0
+        self.dropped = 0  # server closed the connection before FINISHED
+        self.quit = 0  # bots that disconnected on purpose
+        self.questions = 0
+        self.answers = 0
+        self.results = 0
+        self.correct = 0
+        self.unanswered = 0  # no RESULT before the next message (answer too late)
+        self.round_trips: list[float] = []  # QUESTION received -> RESULT received
+        self.response_times: list[float] = []  # ANSWER sent -> RESULT received
+        self.first_question: float | None = None
+        self.last_result: float | None = None
+
+async def read_message(reader: asyncio.StreamReader, decoder: FrameDecoder, codec: Codec) -> dict[str, Any] | None:
+    #Frames that don't decode are skipped, as the servers do; None once the server hangs up
+    while True:
+        try:
+            frame = await read_frame(reader, decoder)
+        except FrameTooLarge:
+            return None
+        if frame is None:
+            return None
+        try:
+            return codec.decode(frame)
+        except ValueError:
+            continue
+
+async def run_bot(bot_id: int, args: argparse.Namespace, stats: Stats, connect_gate: asyncio.Semaphore):
+    rng = random.Random(None if args.seed is None else args.seed + bot_id)
+    username = f"{args.prefix}{bot_id}"
+
+    async with connect_gate:
+        try:
+            reader, writer = await asyncio.open_connection(args.host, args.port)
+        except OSError:
+            stats.connect_failures += 1
+            return
+        sock = writer.get_extra_info("socket")
+        if sock is not None:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+        stats.connected += 1
+        hi_message = {"message_type": "HI", "username": username}
+        if args.codecs:
+            hi_message["codecs"] = args.codecs
+        writer.write(JSON_CODEC.encode(hi_message))
+
+    decoder = FrameDecoder()
+    codec = JSON_CODEC
+    question_at = answered_at = None
+    try:
+        while True:
+            message = await read_message(reader, decoder, codec)
+            if message is None:
+                stats.dropped += 1
+                return
+
+            message_type = message.get("message_type")
+            if question_at is not None and message_type != "RESULT":
+                stats.unanswered += 1
+                question_at = None
+
+            if message_type == "READY":
+                stats.ready += 1
+                chosen = CODECS.get(message.get("codec"))
+                if chosen is not None:
+                    codec = chosen
+                    decoder.set_framing(codec.framing)
+
+            elif message_type == "QUESTION":
+                now = time.monotonic()
+                stats.questions += 1
+                if stats.first_question is None:
+                    stats.first_question = now
+                if rng.random() < args.disconnect_rate:
+                    stats.quit += 1
+                    return
+
+                question_at = now
+                await asyncio.sleep(args.delay(rng))
+                if rng.random() < args.error_rate:
+                    answer = "wrong"
+                else:
+                    answer = automatic_answer(message.get("question_type", ""), message.get("short_question", ""))
+                writer.write(codec.encode({"message_type": "ANSWER", "answer": answer}))
+                answered_at = time.monotonic()
+                stats.answers += 1
+
+            elif message_type == "RESULT" and question_at is not None:
+                now = time.monotonic()
+                stats.results += 1
+                stats.correct += bool(message.get("correct"))
+                stats.round_trips.append(now - question_at)
+                stats.response_times.append(now - answered_at)
+                stats.last_result = now
+                question_at = None
+
+            elif message_type == "FINISHED":
+                stats.finished += 1
+                return
+    except (ConnectionError, OSError):
+        stats.dropped += 1
+    finally:
+        writer.close()
+
+# === REPORT ===
+
+def build_report(args: argparse.Namespace, stats: Stats, elapsed: float) -> dict[str, Any]:
+    answer_window = 0.0
+    if stats.first_question is not None and stats.last_result is not None:
+        answer_window = stats.last_result - stats.first_question
+
+    return {
+        "players": args.players,
+        "connected": stats.connected,
+        "connect_failures": stats.connect_failures,
+        "ready": stats.ready,
+        "finished": stats.finished,
+        "dropped": stats.dropped,
+        "quit": stats.quit,
+        "questions": stats.questions,
+        "answers": stats.answers,
+        "results": stats.results,
+        "correct": stats.correct,
+        "unanswered": stats.unanswered,
+        "elapsed_s": round(elapsed, 3),
+        "results_per_s": round(stats.results / answer_window, 1) if answer_window > 0 else None,
+        "round_trip": latency_stats(stats.round_trips),
+        "response": latency_stats(stats.response_times),
+    }
+
+def print_report(report: dict[str, Any]):
+    print(f"Players: {report['connected']}/{report['players']} connected, {report['ready']} got READY, "
+          f"{report['finished']} finished, {report['dropped']} dropped, {report['quit']} quit")
+    print(f"Answers: {report['answers']} sent for {report['questions']} questions, {report['results']} results "
+          f"({report['correct']} correct), {report['unanswered']} too late")
+    if report["results_per_s"] is not None:
+        print(f"Throughput: {report['results_per_s']} results/s")
+    for key, title in (("round_trip", "QUESTION -> RESULT"), ("response", "ANSWER -> RESULT")):
+        stats = report[key]
+        if stats["count"]:
+            print(f"{title}: p50 {stats['p50_ms']:.1f} ms, p90 {stats['p90_ms']:.1f} ms, "
+                  f"p99 {stats['p99_ms']:.1f} ms, max {stats['max_ms']:.1f} ms")
+
+# --- MAIN
+
+def raise_file_limit(needed: int):
+    #Every bot holds a socket, so thousands of bots need more descriptors than the usual soft limit
+    if resource is None:
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft != resource.RLIM_INFINITY and soft < needed:
+        target = needed if hard == resource.RLIM_INFINITY else min(needed, hard)
+        resource.setrlimit(resource.RLIMIT_NOFILE, (target, hard))
+
+async def run(args: argparse.Namespace) -> dict[str, Any]:
+    stats = Stats()
+    connect_gate = asyncio.Semaphore(args.connect_concurrency)
+    started = time.monotonic()
+    bots = [asyncio.create_task(run_bot(i, args, stats, connect_gate)) for i in range(args.players)]
+    try:
+        await asyncio.wait_for(asyncio.gather(*bots), args.timeout)
+    except asyncio.TimeoutError:
+        print(f"loadgen.py: Stopped after {args.timeout}s", file=sys.stderr)
+    return build_report(args, stats, time.monotonic() - started)
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate many auto-mode players against a trivia server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, required=True)
+    parser.add_argument("--players", type=int, default=100, help="number of bots (default 100)")
+    parser.add_argument("--prefix", default="bot", help="username prefix (default bot)")
+    parser.add_argument("--codecs", nargs="+", metavar="CODEC", help="codecs to offer in HI, in order of preference")
+    parser.add_argument("--delay", type=parse_distribution, default=parse_distribution("fixed:0"),
+                        help="answer delay in ms: fixed:MS, uniform:LOW:HIGH, exp:MEAN or normal:MEAN:STDDEV")
+    parser.add_argument("--error-rate", type=probability, default=0.0, help="chance of answering wrong")
+    parser.add_argument("--disconnect-rate", type=probability, default=0.0,
+                        help="chance per question of leaving the game instead of answering")
+    parser.add_argument("--connect-concurrency", type=int, default=256, help="connections opened at once")
+    parser.add_argument("--seed", type=int, default=None, help="seed for reproducible bot behaviour")
+    parser.add_argument("--timeout", type=float, default=None, help="give up after this many seconds")
+    parser.add_argument("--json", metavar="PATH", help="also write the report as JSON to PATH")
+    args = parser.parse_args()
+
+    raise_file_limit(args.players + 64)
+    report = asyncio.run(run(args))
+    print_report(report)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+if __name__ == "__main__":
+    main()
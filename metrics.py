@@ -0,0 +1,273 @@
+import logging
+import sys
+import threading
+import time
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any
+
+#Counters and histograms for the servers, served in the Prometheus text format, plus the logging setup
+#
+#Metrics are plain module-level objects updated from the game loop (one thread in server.py, the event
+#loop in async_server.py), so an update is a couple of attribute writes with no locking. The HTTP
+#endpoint runs on its own thread and only reads them.
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+FAST_BUCKETS = (1e-6, 5e-6, 1e-5, 5e-5, 1e-4, 5e-4, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1)
+
+REGISTRY: list["Metric"] = []
+
+class Metric:
+#One metric family; `labels` names its label keys and .labels(*values) picks one child
+
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labels: tuple[str, ...] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = labels
+        self.children: dict[tuple[str, ...], Any] = {}
+        REGISTRY.append(self)
+
+    def labels(self, *values: str):
+        child = self.children.get(values)
+        if child is None:
+            child = self.children[values] = self.new_child()
+        return child
+
+    def new_child(self):
+        raise NotImplementedError
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        for values, child in list(self.children.items()):
+            lines.extend(child.render(self.name, label_text(self.label_names, values)))
+        return lines
+
+class Counter(Metric):
+
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labels: tuple[str, ...] = ()):
+        super().__init__(name, help_text, labels)
+        if not labels:
+            self.labels()
+
+    def new_child(self):
+        return CounterValue()
+
+    def inc(self, amount: float = 1):
+        self.children[()].value += amount
+
+class CounterValue:
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount: float = 1):
+        self.value += amount
+
+    def render(self, name: str, labels: str) -> list[str]:
+        return [f"{name}{braces(labels)} {self.value}"]
+
+class Gauge(Counter):
+
+    kind = "gauge"
+
+    def dec(self, amount: float = 1):
+        self.children[()].value -= amount
+
+    def set(self, value: float):
+        self.children[()].value = value
+
+class Histogram(Metric):
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, buckets: tuple[float, ...] = LATENCY_BUCKETS,
+                 labels: tuple[str, ...] = ()):
+        self.buckets = buckets
+        super().__init__(name, help_text, labels)
+        if not labels:
+            self.labels()
+
+    def new_child(self):
+        return HistogramValue(self.buckets)
+
+    def observe(self, value: float):
+        self.children[()].observe(value)
+
+    def time(self) -> "Timer":
+        return Timer(self.children[()])
+
+class HistogramValue:
+#Counts per bucket are kept non-cumulative so observe() touches one slot; render() sums them
+
+    def __init__(self, buckets: tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    def render(self, name: str, labels: str) -> list[str]:
+        counts = list(self.counts)
+        lines = []
+        total = 0
+        for bound, count in zip(self.buckets, counts):
+            total += count
+            le = join_labels(labels, f'le="{bound}"')
+            lines.append(f"{name}_bucket{braces(le)} {total}")
+        total += counts[-1]
+        le = join_labels(labels, 'le="+Inf"')
+        lines.append(f"{name}_bucket{braces(le)} {total}")
+        lines.append(f"{name}_sum{braces(labels)} {self.sum}")
+        lines.append(f"{name}_count{braces(labels)} {total}")
+        return lines
+
+class Timer:
+#with HISTOGRAM.time(): ... observes the seconds spent in the block
+
+    def __init__(self, histogram: HistogramValue):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.started)
+
+def label_text(names: tuple[str, ...], values: tuple[str, ...]) -> str:
+    return ",".join(f'{name}="{escape(str(value))}"' for name, value in zip(names, values))
+
+def join_labels(*parts: str) -> str:
+    return ",".join(part for part in parts if part)
+
+def braces(labels: str) -> str:
+    return "{" + labels + "}" if labels else ""
+
+def escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+def render_metrics() -> str:
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+# === SERVER METRICS ===
+
+CONNECTIONS = Counter("trivia_connections_total", "Connections accepted")
+HANDSHAKE_FAILURES = Counter("trivia_handshake_failures_total", "Connections dropped before a valid HI")
+PLAYERS_CONNECTED = Gauge("trivia_players_connected", "Players who sent HI and haven't disconnected")
+DISCONNECTS = Counter("trivia_disconnects_total", "Players who left or dropped during a game")
+RESUMES = Counter("trivia_resumes_total", "Reconnects that took back a player's seat with a session token")
+MESSAGES_SENT = Counter("trivia_messages_sent_total", "Messages sent, per message type", ("message_type",))
+BYTES_SENT = Counter("trivia_bytes_sent_total", "Encoded bytes handed to sockets")
+MESSAGES_RECEIVED = Counter("trivia_messages_received_total", "Messages received, per message type",
+                            ("message_type",))
+BYTES_RECEIVED = Counter("trivia_bytes_received_total", "Bytes read from sockets")
+DECODE_ERRORS = Counter("trivia_decode_errors_total", "Frames that were malformed or too large")
+QUESTIONS = Counter("trivia_questions_total", "Questions sent")
+ANSWERS = Counter("trivia_answers_total", "Answers graded, per result", ("correct",))
+GRADING_SECONDS = Histogram("trivia_grading_seconds", "Time to grade one answer and build its RESULT",
+                            FAST_BUCKETS)
+BROADCAST_SECONDS = Histogram("trivia_broadcast_seconds", "Time to encode and hand one broadcast to every socket",
+                              FAST_BUCKETS)
+ANSWER_LATENCY = Histogram("trivia_answer_latency_seconds", "Time from sending a QUESTION to receiving the answer")
+
+# Message types a client may send; anything else, including a non-str message_type or a frame that isn't an
+# object, is counted as "other" so clients can't mint label values
+CLIENT_MESSAGE_TYPES = frozenset({"HI", "RESUME", "ANSWER", "BYE"})
+
+def count_received(message: Any):
+    message_type = message.get("message_type") if isinstance(message, dict) else None
+    if not isinstance(message_type, str) or message_type not in CLIENT_MESSAGE_TYPES:
+        message_type = "other"
+    MESSAGES_RECEIVED.labels(message_type).inc()
+
+# --- HTTP endpoint
+
+class MetricsHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render_metrics().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def start_metrics_server(config: dict[str, Any], prog: str = "server.py") -> ThreadingHTTPServer | None:
+    #Serves GET /metrics on "metrics_port" (bound to "metrics_host", default 127.0.0.1) from a daemon thread
+    port = config.get("metrics_port")
+    if port is None:
+        return None
+
+    host = config.get("metrics_host", "127.0.0.1")
+    try:
+        httpd = ThreadingHTTPServer((host, port), MetricsHandler)
+    except OSError:
+        print(f"{prog}: Binding the metrics endpoint to port {port} was unsuccessful", file=sys.stderr)
+        sys.exit(1)
+    httpd.daemon_threads = True
+    threading.Thread(target=httpd.serve_forever, name="metrics", daemon=True).start()
+    logging.getLogger(__name__).info(f"Metrics on http://{host}:{port}/metrics")
+    return httpd
+
+# === LOGGING ===
+
+class RateLimitFilter(logging.Filter):
+#At most `rate` records per second from each call site below WARNING; the next record that gets
+#through says how many were dropped. Per-player lines can't flood stdout in a big game this way.
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+        self.sites: dict[tuple[str, int], list[float]] = {}  # site -> [tokens, last refill, suppressed]
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING or self.rate <= 0:
+            return True
+
+        site = (record.pathname, record.lineno)
+        now = time.monotonic()
+        state = self.sites.get(site)
+        if state is None:
+            state = self.sites[site] = [self.rate, now, 0]
+
+        state[0] = min(self.rate, state[0] + (now - state[1]) * self.rate)
+        state[1] = now
+        if state[0] < 1:
+            state[2] += 1
+            return False
+
+        state[0] -= 1
+        if state[2]:
+            record.msg = f"{record.getMessage()} ({state[2]} similar messages suppressed)"
+            record.args = None
+            state[2] = 0
+        return True
+
+def setup_logging(config: dict[str, Any]):
+    #"log_level" (default INFO) and "log_rate_limit", records per second per call site (default 20, 0 = no limit)
+    #Lines read as the server's plain output always did unless "log_timestamps" is on
+    handler = logging.StreamHandler(sys.stdout)
+    if config.get("log_timestamps", False):
+        handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(message)s"))
+    else:
+        handler.setFormatter(logging.Formatter("%(message)s"))
+    handler.addFilter(RateLimitFilter(config.get("log_rate_limit", 20)))
+
+    root = logging.getLogger()
+    root.handlers[:] = [handler]
+    root.setLevel(str(config.get("log_level", "INFO")).upper())
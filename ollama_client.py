@@ -0,0 +1,252 @@
+import json
+import os
+import re
+import socket
+import threading
+import time
+from collections import OrderedDict
+from typing import Any
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from solvers import normalize_question_type
+
+#Ollama /api/chat client for the client's "ai" mode
+#One requests.Session is made when the client starts and reused for every question, so after the warmup
+#every question goes over the same kept-alive connection instead of a new TCP handshake. Requests run on
+#the caller's thread with their timeouts cut to the question's time limit: when the limit runs out the
+#request fails with a Timeout and its connection is dropped, so nothing is left waiting in the background.
+#
+#With "stream" on, the reply is read token by token from /api/chat's NDJSON stream and the answer is taken
+#as soon as it is complete for the question type (see extract_answer); closing the stream then stops the
+#model, so a chatty or slow model costs only the time to its answer.
+
+CONNECT_TIMEOUT = 2.0
+WARMUP_TIMEOUT = 60.0  # loading a model from disk can take a while
+POOL_SIZE = 4
+CACHE_SIZE = 1024
+
+SYSTEM_PROMPT = (
+    "ONLY answer the question with the FINAL ANSWER without any greetings, explanation or any kind of fluff. For math questions,"
+    "answer with ONLY the final value. For roman numerals, answer with ONLY the decimal. For a usable IP question, answer with "
+    "ONLY the number of usable IPs. For a network/broadcast question answer with ONLY 'network and broadcast' (eg. 192.168.1.0 and 192.168.1.255)"
+)
+
+# === ANSWER EXTRACTION ===
+
+ADDRESS = r"\d{1,3}(?:\.\d{1,3}){3}"
+# A number or address is complete once something follows that can't continue it; "." only counts when
+# another character follows, "10." might still become "10.0.0.0"
+COMPLETE = r"(?=[^\d./]|\.\D)"
+END = r"(?=[^\d./]|\.\D|\.?$)"
+INTEGER = r"(?<![\d./])-?\d+"
+ADDRESS_PAIR = rf"(?<![\d.])({ADDRESS})\s+and\s+({ADDRESS})"
+# Arithmetic replies may show their working, "100 - 5 = 95": the result is what follows the last "="
+RESULT = r"=\s*(-?\d+)"
+
+# question type -> (pattern for a reply still streaming in, pattern for a finished reply)
+ANSWER_PATTERNS = {
+    "Mathematics": (re.compile(RESULT + COMPLETE), re.compile(RESULT + END)),
+    "Roman Numerals": (re.compile(INTEGER + COMPLETE), re.compile(INTEGER + END)),
+    "Usable IP Addresses of a Subnet": (re.compile(INTEGER + COMPLETE), re.compile(INTEGER + END)),
+    "Network and Broadcast Address of a Subnet": (re.compile(ADDRESS_PAIR + COMPLETE), re.compile(ADDRESS_PAIR + END)),
+}
+
+LAST_INTEGER = re.compile(INTEGER + END)
+
+def extract_answer(question_type: str | None, text: str, finished: bool = False) -> str | None:
+    #The first complete answer of the question type's shape in `text` (a whole number, or "a.b.c.d and e.f.g.h"),
+    #in the form the server expects, or None if there isn't one yet or the type has no fixed shape
+    #Mathematics takes the number after the last "=" instead, or the last number when there is no "=", and
+    #a reply still streaming in only has an answer once a result follows an "="
+    question_type = normalize_question_type(question_type or "") or ""
+    patterns = ANSWER_PATTERNS.get(question_type)
+    if patterns is None:
+        return None
+    if question_type == "Mathematics" and finished:
+        match = last_match(patterns[finished], text) or last_match(LAST_INTEGER, text)
+    else:
+        match = patterns[finished].search(text)
+    if match is None:
+        return None
+    if len(match.groups()) == 2:
+        return f"{match.group(1)} and {match.group(2)}"
+    return match.group(match.lastindex or 0)
+
+def last_match(pattern: re.Pattern, text: str) -> re.Match | None:
+    match = None
+    for match in pattern.finditer(text):
+        pass
+    return match
+
+# === ANSWER CACHE ===
+
+class AnswerCache:
+#Model answers by question, least recently used dropped first beyond `size` entries
+#With a `path` the cache is loaded from that JSON file at start and rewritten after every new answer, so
+#a question the model answered once is never sent to it again, in this run or the next
+
+    def __init__(self, size: int = CACHE_SIZE, path: str | None = None):
+        self.size = size
+        self.path = path
+        self.answers: OrderedDict[str, str] = OrderedDict()
+        if path:
+            self.load()
+
+    def __len__(self) -> int:
+        return len(self.answers)
+
+    def get(self, key: str) -> str | None:
+        answer = self.answers.get(key)
+        if answer is not None:
+            self.answers.move_to_end(key)
+        return answer
+
+    def put(self, key: str, answer: str):
+        if self.size <= 0:
+            return
+        self.answers[key] = answer
+        self.answers.move_to_end(key)
+        while len(self.answers) > self.size:
+            self.answers.popitem(last=False)
+        if self.path:
+            self.save()
+
+    def load(self):
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            return  # nothing saved yet, or unreadable: start empty
+        if not isinstance(saved, dict) or self.size <= 0:
+            return
+        for key, answer in list(saved.items())[-self.size:]:
+            if isinstance(answer, str):
+                self.answers[key] = answer
+
+    def save(self):
+        # Written next to the file and renamed over it, so a crash never leaves half a cache
+        temporary = f"{self.path}.tmp"
+        try:
+            with open(temporary, "w", encoding="utf-8") as f:
+                json.dump(self.answers, f)
+            os.replace(temporary, self.path)
+        except OSError:
+            pass
+
+def cache_key(question_type: str | None, short_question: str | None, question_text: str) -> str:
+    #Same question, same key: the question number in the full text is left out whenever the short
+    #question is known, and case and runs of whitespace never matter
+    if short_question:
+        text = f"{question_type or ''}\n{short_question}"
+    else:
+        text = question_text
+    return " ".join(text.split()).lower()
+
+class OllamaClient:
+
+    def __init__(self, host: str, port: int, model: str, stream: bool = False, cache: AnswerCache | None = None):
+        self.base_url = f"http://{host}:{port}"
+        self.model = model
+        self.stream = stream
+        self.cache = cache
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_SIZE)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def warmup(self):
+        #Opens the keep-alive connection and has Ollama load the model (a chat without messages only
+        #loads it), so the first question pays for neither
+        try:
+            response = self.session.post(f"{self.base_url}/api/chat", json={"model": self.model, "messages": []},
+                                         timeout=(CONNECT_TIMEOUT, WARMUP_TIMEOUT))
+            response.content  # read to the end so the connection goes back to the pool
+        except requests.RequestException:
+            pass
+
+    def warmup_in_background(self) -> threading.Thread:
+        thread = threading.Thread(target=self.warmup, name="ollama-warmup", daemon=True)
+        thread.start()
+        return thread
+
+    def chat(self, question_text: str, time_limit: float, question_type: str | None = None) -> str | None:
+        #The model's reply, or None if it failed or didn't arrive within time_limit seconds
+        #When streaming, the reply is cut short at the answer for question types extract_answer knows
+        if time_limit <= 0:
+            return None
+        deadline = time.monotonic() + time_limit
+        body = {
+            "model": self.model,
+            "messages": [
+                {"role": "system", "content": SYSTEM_PROMPT},
+                {"role": "user", "content": question_text}
+            ],
+            "stream": self.stream
+        }
+        if self.stream:
+            return self.chat_streaming(body, deadline, question_type)
+
+        try:
+            response = self.session.post(f"{self.base_url}/api/chat", json=body,
+                                         timeout=(min(CONNECT_TIMEOUT, time_limit), time_limit))
+            response.raise_for_status()
+            data = response.json()
+        except (requests.RequestException, ValueError):
+            return None
+
+        if time.monotonic() >= deadline:
+            return None
+        return data.get("message", {}).get("content") or ""
+
+    def chat_streaming(self, body: dict[str, Any], deadline: float, question_type: str | None) -> str | None:
+        #requests' read timeout applies to each read on its own, so a model sending a token just inside it
+        #would keep the stream going past the deadline; every read is given only the time left instead
+        time_limit = deadline - time.monotonic()
+        parts: list[str] = []
+        try:
+            with self.session.post(f"{self.base_url}/api/chat", json=body, stream=True,
+                                   timeout=(min(CONNECT_TIMEOUT, time_limit), time_limit)) as response:
+                response.raise_for_status()
+                sock = stream_socket(response)
+                lines = response.iter_lines()
+                while True:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return None
+                    if sock is not None:
+                        sock.settimeout(remaining)
+                    line = next(lines, None)
+                    if line is None:
+                        break
+                    if not line:
+                        continue
+                    chunk = json.loads(line)
+                    parts.append(chunk.get("message", {}).get("content") or "")
+                    if chunk.get("done"):
+                        break
+                    answer = extract_answer(question_type, "".join(parts))
+                    if answer is not None:
+                        # Leaving the with block closes the stream, which stops the model
+                        return answer
+        except (requests.RequestException, ValueError):
+            return None
+
+        if time.monotonic() >= deadline:
+            return None
+        text = "".join(parts)
+        return extract_answer(question_type, text, finished=True) or text
+
+    def close(self):
+        self.session.close()
+
+def stream_socket(response: requests.Response) -> socket.socket | None:
+    #The socket a streaming response is read from, None if urllib3 doesn't expose it
+    connection = getattr(response.raw, "connection", None)
+    return getattr(connection, "sock", None)
+
+def ollama_client_from_config(ollama_config: dict[str, Any]) -> OllamaClient:
+    cache = AnswerCache(ollama_config.get("cache_size", CACHE_SIZE), ollama_config.get("cache_path"))
+    return OllamaClient(ollama_config["ollama_host"], ollama_config["ollama_port"], ollama_config["ollama_model"],
+                        bool(ollama_config.get("stream", False)), cache)
@@ -0,0 +1,198 @@
+import argparse
+import json
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Callable
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from http_service import KeepAliveHandler, KeepAliveServer, serve_in_background
+
+#Caching, coalescing proxy for Ollama's /api/chat, for fleets of AI-mode clients sharing one Ollama host
+#Every client gets the same QUESTION at the same moment and sends the same prompt, so the sidecar sends one
+#upstream request per distinct prompt and hands its reply to every client waiting for it; replies are then
+#kept for `ttl` seconds. Model load follows the number of distinct questions instead of the player count.
+#
+#  python3 ollama_sidecar.py --port 11435 --upstream 127.0.0.1:11434
+#
+#Clients point their ollama_host/ollama_port at the sidecar and need no other change. The upstream call is
+#never streamed; a client that asked for a stream gets the whole reply as a single final NDJSON line.
+
+CACHE_SIZE = 4096
+CACHE_TTL = 300.0
+UPSTREAM_TIMEOUT = 120.0
+
+class Coalescer:
+#get(key, fetch) runs fetch() once per key at a time: callers asking for a key that is already being fetched
+#wait for that result instead of starting their own. Results are cached for `ttl` seconds, at most `size`
+#of them, oldest dropped first; failures are passed to every waiter but never cached.
+#Thread-safe, so it can sit in one process shared by many clients as well as behind the sidecar.
+
+    def __init__(self, size: int = CACHE_SIZE, ttl: float = CACHE_TTL):
+        self.size = size
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.cache: OrderedDict[str, tuple[float, Any]] = OrderedDict()  # key -> (expires at, result)
+        self.in_flight: dict[str, Future] = {}
+        self.requests = 0
+        self.cache_hits = 0
+        self.coalesced = 0
+        self.fetches = 0
+
+    def get(self, key: str, fetch: Callable[[], Any]) -> Any:
+        with self.lock:
+            self.requests += 1
+            cached = self.cache.get(key)
+            if cached is not None:
+                if cached[0] > time.monotonic():
+                    self.cache_hits += 1
+                    return cached[1]
+                del self.cache[key]
+
+            future = self.in_flight.get(key)
+            if future is not None:
+                self.coalesced += 1
+                leader = False
+            else:
+                future = self.in_flight[key] = Future()
+                self.fetches += 1
+                leader = True
+
+        if not leader:
+            return future.result()
+
+        try:
+            result = fetch()
+        except BaseException as e:
+            with self.lock:
+                del self.in_flight[key]
+            future.set_exception(e)
+            raise
+
+        with self.lock:
+            del self.in_flight[key]
+            if self.size > 0 and self.ttl > 0:
+                self.cache[key] = (time.monotonic() + self.ttl, result)
+                while len(self.cache) > self.size:
+                    self.cache.popitem(last=False)
+        future.set_result(result)
+        return result
+
+    def stats(self) -> dict[str, int]:
+        with self.lock:
+            return {
+                "requests": self.requests,
+                "upstream_requests": self.fetches,
+                "coalesced": self.coalesced,
+                "cache_hits": self.cache_hits,
+                "cached": len(self.cache),
+                "in_flight": len(self.in_flight),
+            }
+
+def prompt_key(request: dict[str, Any]) -> str:
+    #Everything that changes the model's reply; "stream" and "keep_alive" don't
+    fields = {name: request.get(name) for name in ("model", "messages", "format", "options", "system", "template")}
+    return json.dumps(fields, sort_keys=True, separators=(",", ":"))
+
+class UpstreamError(Exception):
+
+    def __init__(self, status: int, body: bytes):
+        super().__init__(f"upstream answered {status}")
+        self.status = status
+        self.body = body
+
+# === HTTP ===
+
+class SidecarHandler(KeepAliveHandler):
+
+    def do_GET(self):
+        if self.path == "/sidecar/stats":
+            self.send_body(200, json.dumps(self.server.coalescer.stats()).encode("utf-8"), "application/json")
+        elif self.path == "/":
+            self.send_body(200, b"Ollama is running", "text/plain; charset=utf-8")
+        else:
+            self.send_error(404)
+
+    def do_POST(self):
+        if self.path != "/api/chat":
+            self.send_error(404)
+            return
+        try:
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+        except ValueError:
+            self.send_error(400)
+            return
+        if not isinstance(request, dict):
+            self.send_error(400)
+            return
+
+        try:
+            if request.get("messages"):
+                body = self.server.coalescer.get(prompt_key(request), lambda: self.server.fetch(request))
+            else:
+                body = self.server.fetch(request)  # a warmup, has to reach Ollama to load the model
+        except UpstreamError as e:
+            self.send_body(e.status, e.body, "application/json")
+            return
+        except requests.RequestException as e:
+            self.send_body(502, json.dumps({"error": f"upstream unavailable: {e}"}).encode("utf-8"), "application/json")
+            return
+
+        if request.get("stream", True):
+            self.send_body(200, body + b"\n", "application/x-ndjson")
+        else:
+            self.send_body(200, body, "application/json; charset=utf-8")
+
+class Sidecar(KeepAliveServer):
+#Handler threads block in Coalescer.get while the leader's upstream request runs, so one slow prompt holds
+#a thread per waiting client but only one upstream connection
+
+    def __init__(self, upstream: str, port: int = 0, host: str = "127.0.0.1", size: int = CACHE_SIZE,
+                 ttl: float = CACHE_TTL, timeout: float = UPSTREAM_TIMEOUT):
+        super().__init__((host, port), SidecarHandler)
+        self.upstream_url = f"http://{upstream}/api/chat"
+        self.timeout = timeout
+        self.coalescer = Coalescer(size, ttl)
+        self.session = requests.Session()
+        # One connection per distinct prompt in flight, not per waiting client
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=64)
+        self.session.mount("http://", adapter)
+
+    def fetch(self, request: dict[str, Any]) -> bytes:
+        #The whole upstream reply as one JSON object
+        response = self.session.post(self.upstream_url, json={**request, "stream": False}, timeout=self.timeout)
+        if response.status_code != 200:
+            raise UpstreamError(response.status_code, response.content)
+        return response.content.strip()
+
+def start_sidecar(upstream: str, port: int = 0, **options) -> Sidecar:
+    #In-process sidecar in front of `upstream`, as bench_sidecar runs it next to its fake model
+    return serve_in_background(Sidecar(upstream, port, **options), "ollama-sidecar")
+
+def main():
+    parser = argparse.ArgumentParser(description="Coalescing, caching proxy for Ollama's /api/chat")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--host", default="127.0.0.1", help="address to listen on (default 127.0.0.1)")
+    parser.add_argument("--upstream", default="127.0.0.1:11434", help="Ollama's host:port")
+    parser.add_argument("--cache-size", type=int, default=CACHE_SIZE, help="replies kept, 0 for none")
+    parser.add_argument("--ttl", type=float, default=CACHE_TTL, help="seconds a reply is kept")
+    parser.add_argument("--timeout", type=float, default=UPSTREAM_TIMEOUT, help="seconds to wait for Ollama")
+    args = parser.parse_args()
+
+    try:
+        server = Sidecar(args.upstream, args.port, args.host, args.cache_size, args.ttl, args.timeout)
+    except OSError:
+        print(f"ollama_sidecar.py: Binding to port {args.port} was unsuccessful", file=sys.stderr)
+        sys.exit(1)
+    print(f"Ollama sidecar on http://{args.host}:{server.port}, forwarding to http://{args.upstream}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
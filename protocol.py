@@ -0,0 +1,249 @@
+#Wire-level helpers shared by server.py, async_server.py, client.py and loadgen.py
+
+import json
+from collections import deque
+from typing import Any, Callable
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+MAX_FRAME_SIZE = 1 << 20
+READ_SIZE = 1 << 16
+COMPACT_THRESHOLD = 1 << 16
+LENGTH_PREFIX = 4
+
+class FrameTooLarge(ValueError):
+    pass
+
+class FrameDecoder:
+#Incremental frame decoder, one per connection
+#"line" frames end in b"\n", "length" frames start with a 4-byte big-endian size
+#Bytes are appended to a single bytearray and consumed through a read offset, so coalesced or
+#pipelined frames are never dropped and every byte is scanned for b"\n" at most once
+
+    def __init__(self, max_frame_size: int = MAX_FRAME_SIZE, framing: str = "line"):
+        self.max_frame_size = max_frame_size
+        self.framing = framing
+        self.buffer = bytearray()
+        self.start = 0  # first byte of the current (incomplete) frame
+        self.scanned = 0  # bytes after start already known not to contain b"\n"
+
+    def set_framing(self, framing: str):
+        #Switching keeps buffered bytes, they are read with the new framing
+        self.framing = framing
+        self.scanned = 0
+
+    def feed(self, data: bytes | bytearray | memoryview):
+        if self.start and self.start >= COMPACT_THRESHOLD and self.start * 2 >= len(self.buffer):
+            del self.buffer[:self.start]
+            self.start = 0
+        self.buffer += data
+
+    def next_frame(self) -> bytes | None:
+        if self.framing == "length":
+            return self.next_length_frame()
+
+        end = self.buffer.find(b"\n", self.start + self.scanned)
+        if end == -1:
+            self.scanned = len(self.buffer) - self.start
+            if self.scanned > self.max_frame_size:
+                raise FrameTooLarge(f"frame exceeds {self.max_frame_size} bytes")
+            return None
+
+        if end - self.start > self.max_frame_size:
+            raise FrameTooLarge(f"frame exceeds {self.max_frame_size} bytes")
+
+        return self.take(self.start, end, end + 1)
+
+    def next_length_frame(self) -> bytes | None:
+        size = self.length_prefix()
+        if size is None or len(self.buffer) - self.start < LENGTH_PREFIX + size:
+            return None
+        body = self.start + LENGTH_PREFIX
+        return self.take(body, body + size, body + size)
+
+    def length_prefix(self) -> int | None:
+        if len(self.buffer) - self.start < LENGTH_PREFIX:
+            return None
+        size = int.from_bytes(self.buffer[self.start:self.start + LENGTH_PREFIX], "big")
+        if size > self.max_frame_size:
+            raise FrameTooLarge(f"frame exceeds {self.max_frame_size} bytes")
+        return size
+
+    def take(self, begin: int, end: int, next_start: int) -> bytes:
+        with memoryview(self.buffer) as view:
+            frame = bytes(view[begin:end])
+        self.start = next_start
+        self.scanned = 0
+        if self.start == len(self.buffer):
+            self.buffer.clear()
+            self.start = 0
+        return frame
+
+    def __iter__(self):
+        while True:
+            frame = self.next_frame()
+            if frame is None:
+                return
+            yield frame
+
+    def flush(self) -> bytes | None:
+        #Returns whatever unterminated bytes are left once the peer has closed the stream
+        rest = bytes(self.buffer[self.start:])
+        self.buffer.clear()
+        self.start = 0
+        self.scanned = 0
+        if self.framing == "line" and rest.strip():
+            return rest
+        return None
+
+async def read_frame(reader, decoder: FrameDecoder, on_read: Callable[[int], Any] | None = None) -> bytes | None:
+    #Next frame from an asyncio StreamReader, an unterminated last line included; None once the peer is gone
+    #Raises FrameTooLarge. `on_read` is told the size of every chunk read, for byte counters
+    while True:
+        frame = decoder.next_frame()
+        if frame is not None:
+            return frame
+
+        try:
+            chunk = await reader.read(READ_SIZE)
+        except ConnectionError:
+            return None
+        if not chunk:
+            return decoder.flush()
+
+        if on_read is not None:
+            on_read(len(chunk))
+        decoder.feed(chunk)
+
+# === CODECS ===
+
+class Codec:
+#encode() returns a complete frame, decode() takes a frame without its framing
+#decode() raises ValueError (or a subclass) on malformed input, including a frame that isn't a message object
+
+    name = ""
+    framing = "line"
+
+    def encode(self, message: dict[str, Any]) -> bytes:
+        raise NotImplementedError
+
+    def decode(self, frame: bytes) -> dict[str, Any]:
+        raise NotImplementedError
+
+def json_object(message: Any) -> dict[str, Any]:
+    #Every message is an object; any other JSON value is as malformed as invalid JSON
+    if not isinstance(message, dict):
+        raise ValueError("JSON frame is not an object")
+    return message
+
+class JsonCodec(Codec):
+
+    name = "json"
+
+    def encode(self, message: dict[str, Any]) -> bytes:
+        return (json.dumps(message) + "\n").encode("utf-8")
+
+    def decode(self, frame: bytes) -> dict[str, Any]:
+        return json_object(json.loads(frame.decode("utf-8")))
+
+class OrjsonCodec(Codec):
+#Same JSON lines on the wire, orjson never emits a raw newline inside a document
+
+    name = "orjson"
+
+    def encode(self, message: dict[str, Any]) -> bytes:
+        return orjson.dumps(message, option=orjson.OPT_APPEND_NEWLINE)
+
+    def decode(self, frame: bytes) -> dict[str, Any]:
+        return json_object(orjson.loads(frame))
+
+class LengthPrefixedJsonCodec(Codec):
+
+    name = "json-lp"
+    framing = "length"
+
+    def encode(self, message: dict[str, Any]) -> bytes:
+        body = json.dumps(message, separators=(",", ":")).encode("utf-8")
+        return len(body).to_bytes(LENGTH_PREFIX, "big") + body
+
+    def decode(self, frame: bytes) -> dict[str, Any]:
+        return json_object(json.loads(frame))
+
+class MsgpackCodec(Codec):
+
+    name = "msgpack"
+    framing = "length"
+
+    def encode(self, message: dict[str, Any]) -> bytes:
+        body = msgpack.packb(message)
+        return len(body).to_bytes(LENGTH_PREFIX, "big") + body
+
+    def decode(self, frame: bytes) -> dict[str, Any]:
+        try:
+            message = msgpack.unpackb(frame)
+        except Exception as e:
+            raise ValueError(f"invalid msgpack frame: {e}") from e
+        if not isinstance(message, dict):
+            raise ValueError("msgpack frame is not a map")
+        return message
+
+JSON_CODEC = JsonCodec()
+
+CODECS: dict[str, Codec] = {JSON_CODEC.name: JSON_CODEC, "json-lp": LengthPrefixedJsonCodec()}
+if orjson is not None:
+    CODECS["orjson"] = OrjsonCodec()
+if msgpack is not None:
+    CODECS["msgpack"] = MsgpackCodec()
+
+def negotiate_codec(offered) -> Codec:
+    #Picks the first codec in a HI message's "codecs" list that this side supports
+    if isinstance(offered, list):
+        for name in offered:
+            codec = CODECS.get(name) if isinstance(name, str) else None
+            if codec is not None:
+                return codec
+    return JSON_CODEC
+
+class SendQueue:
+#Pending outgoing bytes for one non-blocking socket
+#The same payload object can sit in many queues at once, so a broadcast is encoded only once
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.chunks: deque[memoryview] = deque()
+        self.size = 0  # bytes not yet sent
+
+    def __bool__(self) -> bool:
+        return bool(self.chunks)
+
+    def push(self, payload: bytes):
+        self.chunks.append(memoryview(payload))
+        self.size += len(payload)
+
+    def flush(self) -> bool:
+        #Writes as much as the socket accepts without blocking, True once everything is sent
+        #Raises OSError if the peer is gone
+        while self.chunks:
+            chunk = self.chunks[0]
+            try:
+                sent = self.sock.send(chunk)
+            except (BlockingIOError, InterruptedError):
+                return False
+            self.size -= sent
+            if sent < len(chunk):
+                self.chunks[0] = chunk[sent:]
+                return False
+            self.chunks.popleft()
+        return True
+
+    def clear(self):
+        self.chunks.clear()
+        self.size = 0
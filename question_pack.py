@@ -0,0 +1,216 @@
+import argparse
+import mmap
+import random
+import struct
+import sys
+import time
+from array import array
+from functools import lru_cache
+from typing import Any, Callable
+
+from questions import QUESTION_GENERATORS
+from solvers import SOLVERS
+
+#Question packs: (short_question, answer) pairs pregenerated offline into one memory-mapped file
+#
+#Layout (little-endian):
+#  header      b"TQPK", version u16, type count u16
+#  type table  per type: name length u16, name (utf-8), count u32, offsets position u64, data position u64
+#  per type    count + 1 offsets (u32, relative to the data position), then the records
+#  record      short_question + b"\0" + answer (utf-8)
+
+MAGIC = b"TQPK"
+VERSION = 1
+HEADER = struct.Struct("<4sHH")
+NAME_LENGTH = struct.Struct("<H")
+TYPE_ENTRY = struct.Struct("<IQQ")
+OFFSET_PAIR = struct.Struct("<II")
+MAX_DUPLICATES_IN_A_ROW = 10_000
+
+class PackError(Exception):
+    pass
+
+class QuestionPack:
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        try:
+            magic, version, type_count = HEADER.unpack_from(self.map, 0)
+        except struct.error:
+            raise PackError(f"{path} is not a question pack")
+        if magic != MAGIC or version != VERSION:
+            raise PackError(f"{path} is not a version {VERSION} question pack")
+
+        self.types: dict[str, tuple[int, int, int]] = {}  # name -> (count, offsets_pos, data_pos)
+        pos = HEADER.size
+        for _ in range(type_count):
+            (name_length,) = NAME_LENGTH.unpack_from(self.map, pos)
+            pos += NAME_LENGTH.size
+            name = self.map[pos:pos + name_length].decode("utf-8")
+            pos += name_length
+            self.types[name] = TYPE_ENTRY.unpack_from(self.map, pos)
+            pos += TYPE_ENTRY.size
+
+    def count(self, question_type: str) -> int:
+        return self.types[question_type][0]
+
+    def get(self, question_type: str, index: int) -> tuple[str, str]:
+        count, offsets_pos, data_pos = self.types[question_type]
+        if not 0 <= index < count:
+            raise IndexError(index)
+        start, end = OFFSET_PAIR.unpack_from(self.map, offsets_pos + 4 * index)
+        record = self.map[data_pos + start:data_pos + end].decode("utf-8")
+        short_question, _, answer = record.partition("\0")
+        return short_question, answer
+
+    def __iter__(self):
+        for question_type, (count, _, _) in self.types.items():
+            for index in range(count):
+                yield (question_type, *self.get(question_type, index))
+
+    def close(self):
+        self.map.close()
+
+class PackDealer:
+#Draws questions for one game: seeded, and no question repeats until its type is used up
+
+    def __init__(self, pack: QuestionPack, rng: random.Random):
+        self.pack = pack
+        self.rng = rng
+        self.used: dict[str, set[int]] = {}
+
+    def has_type(self, question_type: str) -> bool:
+        return question_type in self.pack.types
+
+    def deal(self, question_type: str) -> tuple[str, str]:
+        count = self.pack.count(question_type)
+        used = self.used.setdefault(question_type, set())
+        if len(used) >= count:
+            used.clear()
+
+        index = self.rng.randrange(count)
+        while index in used:
+            index = self.rng.randrange(count)
+        used.add(index)
+        return self.pack.get(question_type, index)
+
+@lru_cache(maxsize=None)
+def load_pack(path: str) -> QuestionPack:
+    return QuestionPack(path)
+
+def open_question_dealer(config: dict[str, Any], rng: random.Random,
+                         log: Callable[[str], Any] = print) -> PackDealer | None:
+    #`rng` is the game's own RNG, so pack draws replay with the game seed
+    path = config.get("question_pack")
+    if not path:
+        return None
+
+    try:
+        pack = load_pack(path)
+    except (OSError, PackError) as e:
+        print(f"server.py: Could not open question pack: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    log(f"Drawing questions from {path}")
+    return PackDealer(pack, rng)
+
+# === BUILDING PACKS ===
+
+def build_pack(path: str, count: int, question_types: list[str], seed: int | None = None,
+               log: Callable[[str], Any] = print):
+    #Generates up to `count` distinct questions per type, fewer when a type runs out of distinct questions
+    rng = random.Random(seed)
+    sections = []
+    for question_type in question_types:
+        generate = QUESTION_GENERATORS[question_type]
+        seen: set[str] = set()
+        offsets = array("I", [0])
+        data = bytearray()
+        duplicates = 0
+        started = time.perf_counter()
+
+        while len(seen) < count and duplicates < MAX_DUPLICATES_IN_A_ROW:
+            short_question = generate(rng)
+            if short_question in seen:
+                duplicates += 1
+                continue
+            duplicates = 0
+            seen.add(short_question)
+            answer = SOLVERS[question_type](short_question)
+            data += f"{short_question}\0{answer}".encode("utf-8")
+            if len(data) > 0xFFFFFFFF:
+                raise PackError(f"{question_type} records exceed 4 GiB, build a smaller pack")
+            offsets.append(len(data))
+
+        if sys.byteorder != "little":
+            offsets.byteswap()
+        sections.append((question_type, len(offsets) - 1, offsets.tobytes(), bytes(data)))
+        log(f"{question_type}: {len(offsets) - 1} questions in {time.perf_counter() - started:.1f}s")
+
+    names = [question_type.encode("utf-8") for question_type, _, _, _ in sections]
+    pos = HEADER.size + sum(NAME_LENGTH.size + len(name) + TYPE_ENTRY.size for name in names)
+
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(sections)))
+        for name, (_, type_count, offsets, data) in zip(names, sections):
+            f.write(NAME_LENGTH.pack(len(name)) + name)
+            f.write(TYPE_ENTRY.pack(type_count, pos, pos + len(offsets)))
+            pos += len(offsets) + len(data)
+        for _, _, offsets, data in sections:
+            f.write(offsets)
+            f.write(data)
+
+# --- MAIN
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or inspect question packs")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    build = commands.add_parser("build", help="pregenerate a question pack")
+    build.add_argument("out", help="pack file to write")
+    build.add_argument("--count", type=int, default=100_000, help="questions per type (default 100000)")
+    build.add_argument("--seed", type=int, default=None, help="seed for reproducible packs")
+    build.add_argument("--types", nargs="+", default=list(QUESTION_GENERATORS),
+                       choices=list(QUESTION_GENERATORS), metavar="TYPE", help="question types to include")
+
+    info = commands.add_parser("info", help="show how many questions of each type a pack holds")
+    info.add_argument("pack")
+
+    verify = commands.add_parser("verify", help="re-solve every question in bulk and compare answers (needs numpy)")
+    verify.add_argument("pack")
+
+    args = parser.parse_args()
+    if args.command == "build":
+        build_pack(args.out, args.count, args.types, args.seed)
+        return
+
+    try:
+        pack = QuestionPack(args.pack)
+    except (OSError, PackError) as e:
+        print(f"question_pack.py: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    if args.command == "info":
+        for question_type in pack.types:
+            print(f"{question_type}: {pack.count(question_type)}")
+    elif verify_pack(pack) > 0:
+        sys.exit(1)
+
+def verify_pack(pack: QuestionPack, log: Callable[[str], Any] = print) -> int:
+    #Returns the number of stored answers that disagree with the batch answer engine
+    from batch_answers import answer_batch
+
+    mismatches = 0
+    for question_type in pack.types:
+        records = [pack.get(question_type, index) for index in range(pack.count(question_type))]
+        expected = answer_batch(question_type, [short_question for short_question, _ in records])
+        wrong = sum(1 for (_, answer), correct in zip(records, expected) if answer != correct)
+        log(f"{question_type}: {len(records)} questions, {wrong} wrong answers")
+        mismatches += wrong
+    return mismatches
+
+if __name__ == "__main__":
+    main()
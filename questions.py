@@ -1,13 +1,25 @@
 import random
 
-def generate_mathematics_question() -> str:
-    operands_num = random.randint(2, 5)
+from solvers import ROMAN_NUMERALS
+
+#Every game owns a seeded random.Random (see new_game_rng) and passes it to the generators, so a
+#game can be replayed from its logged seed and concurrent games never share RNG state
+shared_rng = random.Random()
+
+def new_game_rng(seed: int | None = None) -> tuple[int, random.Random]:
+    if seed is None:
+        seed = random.SystemRandom().randrange(2 ** 32)
+    return seed, random.Random(seed)
+
+def generate_mathematics_question(rng: random.Random | None = None) -> str:
+    rng = rng or shared_rng
+    operands_num = rng.randint(2, 5)
     #Needing to have at least one operand >= 90 wasn't in the spec?
-    operands = [str(random.randint(1, 100)) for _ in range(operands_num - 1)]
-    operands.append(str(random.randint(90, 100)))
-    random.shuffle(operands)
+    operands = [str(rng.randint(1, 100)) for _ in range(operands_num - 1)]
+    operands.append(str(rng.randint(90, 100)))
+    rng.shuffle(operands)
 
-    operators = random.choices(['+', '-'], k=operands_num - 1)
+    operators = rng.choices(['+', '-'], k=operands_num - 1)
 
     expr_parts = []
     for i in range(operands_num - 1):
@@ -16,27 +28,25 @@ def generate_mathematics_question() -> str:
     expr_parts.append(operands[-1])
     return ' '.join(expr_parts)
 
-def generate_roman_numerals_question() -> str:
-    number = random.randint(1, 3999)
-
-    vals = [
-        (1000, 'M'), (900, 'CM'), (500, 'D'), (400, 'CD'), (100, 'C'), (90, 'XC'),
-        (50, 'L'), (40, 'XL'), (10, 'X'), (9, 'IX'), (5, 'V'), (4, 'IV'), (1, 'I')
-    ]
-
-    roman_numeral = ""
-    for (val, symbol) in vals:
-        while number >= val:
-            roman_numeral += symbol
-            number -= val
-    return roman_numeral
+def generate_roman_numerals_question(rng: random.Random | None = None) -> str:
+    rng = rng or shared_rng
+    return ROMAN_NUMERALS[rng.randint(1, 3999)]
     
-def generate_usable_addresses_question() -> str:
-    base = [str(random.randint(1,223))] + [str(random.randint(0,255)) for _ in range(3)]
-    prefix = random.randint(0, 32)
+def generate_usable_addresses_question(rng: random.Random | None = None) -> str:
+    rng = rng or shared_rng
+    base = [str(rng.randint(1,223))] + [str(rng.randint(0,255)) for _ in range(3)]
+    prefix = rng.randint(0, 32)
+    return ".".join(base) + "/" + str(prefix)
+
+def generate_network_broadcast_question(rng: random.Random | None = None) -> str:
+    rng = rng or shared_rng
+    base = [str(rng.randint(1,223))] + [str(rng.randint(0,255)) for _ in range(3)]
+    prefix = rng.randint(0, 32)
     return ".".join(base) + "/" + str(prefix)
 
-def generate_network_broadcast_question() -> str:
-    base = [str(random.randint(1,223))] + [str(random.randint(0,255)) for _ in range(3)]
-    prefix = random.randint(0, 32)
-    return ".".join(base) + "/" + str(prefix)
\ No newline at end of file
+QUESTION_GENERATORS = {
+    "Mathematics": generate_mathematics_question,
+    "Roman Numerals": generate_roman_numerals_question,
+    "Usable IP Addresses of a Subnet": generate_usable_addresses_question,
+    "Network and Broadcast Address of a Subnet": generate_network_broadcast_question,
+}
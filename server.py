@@ -1,98 +1,238 @@
 #AI Acknowledgement - Artificial Intelligence was used for debugging sometimes, as well as giving me a second opinion on analyzing the possible reasons behind some testcases failing
 
 import json
+import logging
+import math
+import random
+import secrets
 import socket
 import sys
 import time
-import select
-import threading
+import selectors
+from collections import deque
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Any
-
-from questions import (
-    generate_mathematics_question,
-    generate_roman_numerals_question,
-    generate_usable_addresses_question,
-    generate_network_broadcast_question
-)
+from typing import Any, Callable
+from weakref import WeakKeyDictionary
+
+import event_log
+from event_log import player_id
+from latency import latency_stats
+from leaderboard import Leaderboard
+import metrics
+from protocol import JSON_CODEC, Codec, FrameDecoder, FrameTooLarge, SendQueue, negotiate_codec
+from questions import QUESTION_GENERATORS, new_game_rng
+from solvers import SOLVERS, normalize_question_type
+from question_pack import PackDealer, open_question_dealer
 
 # === HANDLE MESSAGES ===
 
 def encode_message(message: dict[str, Any]) -> bytes:
-    return (json.dumps(message) + "\n").encode("utf-8")
+    return JSON_CODEC.encode(message)
 
 def decode_message(data: bytes) -> dict[str, Any]:
-    return json.loads(data.decode("utf-8"))
+    return JSON_CODEC.decode(data)
 
-def send_message(connection: socket.socket, data: dict[str, Any]):
-    try:
-        connection.sendall(encode_message(data))
-    except (BrokenPipeError, ConnectionResetError, OSError):
-        pass
+SEND_TIMEOUT = 2.0
+MAX_SEND_QUEUE = 1 << 20  # same cap as async_server's MAX_WRITE_BUFFER
+HI_TIMEOUT = 2.0
+RESUME_INFO = "Welcome back, {username}! You rejoin at the next question."
 
-def receive_message(connection: socket.socket) -> dict[str, Any]:
-    buffer = b""
-    while True:
-        try:
-            chunk = connection.recv(1024)
-        except OSError:
-            return None
+logger = logging.getLogger("server")
 
-        if not chunk:
-            if buffer.strip():
-                try:
-                    return decode_message(buffer)
-                except Exception:
-                    return None
-            return None
+# Bytes a slow reader hasn't accepted yet wait here and go out before anything newer
+send_queues: "WeakKeyDictionary[socket.socket, SendQueue]" = WeakKeyDictionary()
+# Queues with bytes left over, and the selector the game loop is waiting on (see flushing): sends never
+# block, whatever a socket doesn't take right away is written when that selector finds it writable
+backlog: set[SendQueue] = set()
+active_selector: selectors.BaseSelector | None = None
 
-        buffer += chunk
+def get_send_queue(connection: socket.socket) -> SendQueue:
+    queue = send_queues.get(connection)
+    if queue is None:
+        queue = send_queues[connection] = SendQueue(connection)
+    return queue
 
-        if b"\n" in buffer:
-            raw, _, buffer = buffer.partition(b"\n")
+def send_message(connection: socket.socket, data: dict[str, Any]):
+    metrics.MESSAGES_SENT.labels(data["message_type"]).inc()
+    send_payloads([(connection, get_codec(connection).encode(data))])
+
+def broadcast_message(connections, data: dict[str, Any]):
+    #Serializes once per codec in use, then fans the same bytes out to every connection
+    with metrics.BROADCAST_SECONDS.time():
+        payloads: dict[str, bytes] = {}
+        pairs = []
+        for conn in connections:
+            codec = get_codec(conn)
+            payload = payloads.get(codec.name)
+            if payload is None:
+                payload = payloads[codec.name] = codec.encode(data)
+            pairs.append((conn, payload))
+        metrics.MESSAGES_SENT.labels(data["message_type"]).inc(len(pairs))
+        send_payloads(pairs)
+
+def send_each(messages: dict[socket.socket, dict[str, Any]]):
+    #One message per connection; connections given the same message object share its bytes
+    payloads: dict[tuple[str, int], bytes] = {}
+    pairs = []
+    for conn, data in messages.items():
+        codec = get_codec(conn)
+        key = (codec.name, id(data))
+        payload = payloads.get(key)
+        if payload is None:
+            payload = payloads[key] = codec.encode(data)
+        pairs.append((conn, payload))
+        metrics.MESSAGES_SENT.labels(data["message_type"]).inc()
+    send_payloads(pairs)
+
+def send_payloads(pairs):
+    #Writes what each socket takes without blocking and queues the rest. A reader that falls more than
+    #MAX_SEND_QUEUE bytes behind is shut down, its next read sees EOF and it is dropped like any disconnect
+    sent_bytes = 0
+    for conn, payload in pairs:
+        sent_bytes += len(payload)
+        queue = get_send_queue(conn)
+        queue.push(payload)
+        try:
+            done = queue.flush()
+        except OSError:
+            queue.clear()
+            done = True
+        if done:
+            backlog.discard(queue)
+        elif queue.size > MAX_SEND_QUEUE:
+            logger.info(f"Disconnecting a client that is {queue.size} bytes behind")
+            queue.clear()
+            unwatch_writes(queue)
             try:
-                return decode_message(raw)
-            except Exception:
+                conn.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        elif queue not in backlog:
+            backlog.add(queue)
+            watch_writes(queue)
+    metrics.BYTES_SENT.inc(sent_bytes)
+
+@contextmanager
+def flushing(selector: selectors.BaseSelector):
+    #While the block runs, sockets with queued bytes are watched for EVENT_WRITE in `selector`, and the
+    #loop hands those events to on_writable. Register readers before entering, writes are added to them
+    global active_selector
+    previous, active_selector = active_selector, selector
+    for queue in list(backlog):
+        watch_writes(queue)
+    try:
+        yield
+    finally:
+        active_selector = previous
+
+def watch_writes(queue: SendQueue):
+    selector = active_selector
+    if selector is None:
+        return
+    try:
+        key = selector.get_key(queue.sock)
+    except KeyError:
+        selector.register(queue.sock, selectors.EVENT_WRITE)
+        return
+    except ValueError:
+        backlog.discard(queue)  # closed
+        return
+    if not key.events & selectors.EVENT_WRITE:
+        selector.modify(queue.sock, key.events | selectors.EVENT_WRITE, key.data)
+
+def unwatch_writes(queue: SendQueue):
+    backlog.discard(queue)
+    if active_selector is not None:
+        try:
+            drop_interest(active_selector, queue.sock, selectors.EVENT_WRITE)
+        except (KeyError, ValueError):
+            pass
 
-                buffer = b""
-                continue
+def on_writable(selector: selectors.BaseSelector, conn: socket.socket):
+    queue = send_queues.get(conn)
+    try:
+        done = queue is None or queue.flush()
+    except OSError:
+        queue.clear()
+        done = True
+    if done:
+        backlog.discard(queue)
+        drop_interest(selector, conn, selectors.EVENT_WRITE)
+
+def stop_reading(selector: selectors.BaseSelector, conn: socket.socket):
+    drop_interest(selector, conn, selectors.EVENT_READ)
+
+def drop_interest(selector: selectors.BaseSelector, conn: socket.socket, event: int):
+    #Removes one event from conn's registration, keeping the other (and its data) if it had both
+    key = selector.get_key(conn)
+    events = key.events & ~event
+    if not events:
+        selector.unregister(conn)
+    elif event == selectors.EVENT_READ:
+        selector.modify(conn, events)  # write-only keys carry no data
+    else:
+        selector.modify(conn, events, key.data)
+
+def forget_send_queue(conn: socket.socket):
+    #Before closing: a closed socket's fd may be reused, so it mustn't stay in the backlog or the selector
+    queue = send_queues.pop(conn, None)
+    if queue is not None:
+        queue.clear()
+        backlog.discard(queue)
+    if active_selector is not None:
         try:
-            return decode_message(buffer)
-        except json.JSONDecodeError:
+            active_selector.unregister(conn)
+        except (KeyError, ValueError):
+            pass
 
-            continue
+def drain_send_queues(timeout: float):
+    #Waits up to `timeout` for every queued byte to go out, for the last message before closing
+    deadline = time.monotonic() + timeout
+    with selectors.DefaultSelector() as selector, flushing(selector):
+        while selector.get_map():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            for key, _ in selector.select(remaining):
+                on_writable(selector, key.fileobj)
 
-# === HANDLE QUESTIONS ===
+# Codec negotiated in the HI/READY handshake, plain JSON lines until then
+codecs: "WeakKeyDictionary[socket.socket, Codec]" = WeakKeyDictionary()
 
-def normalize_question_type(qtype: str) -> str:
+def get_codec(connection: socket.socket) -> Codec:
+    return codecs.get(connection, JSON_CODEC)
 
-    q = qtype.strip().lower().replace("_", " ")
-    mapping = {
-        "mathematics": "Mathematics",
-        "roman numerals": "Roman Numerals",
-        "usable ip addresses of a subnet": "Usable IP Addresses of a Subnet",
-        "usable addresses": "Usable IP Addresses of a Subnet",
-        "network and broadcast address of a subnet": "Network and Broadcast Address of a Subnet",
-        "network broadcast": "Network and Broadcast Address of a Subnet",
-    }
-    return mapping.get(q)
+def set_codec(connection: socket.socket, codec: Codec):
+    codecs[connection] = codec
+    get_decoder(connection).set_framing(codec.framing)
+
+# Per-connection decoder state survives between reads, a frame can arrive split over several recv calls
+decoders: "WeakKeyDictionary[socket.socket, FrameDecoder]" = WeakKeyDictionary()
+
+def get_decoder(connection: socket.socket) -> FrameDecoder:
+    decoder = decoders.get(connection)
+    if decoder is None:
+        decoder = decoders[connection] = FrameDecoder()
+    return decoder
 
-def generate_question(question_type: str, config: dict[str, Any], 
-                      question_num: int) -> dict[str, Any]:
+# === HANDLE QUESTIONS ===
+
+def generate_question(question_type: str, config: dict[str, Any], question_num: int,
+                      dealer: PackDealer | None = None, rng: random.Random | None = None) -> dict[str, Any]:
     
     key = normalize_question_type(question_type)
     if key is None:
         print(f"server.py: Unknown question type '{question_type}'", file=sys.stderr)
         sys.exit(1)
 
-    if key == "Mathematics":
-        short_question = generate_mathematics_question()
-    elif key == "Roman Numerals":
-        short_question = generate_roman_numerals_question()
-    elif key == "Usable IP Addresses of a Subnet":
-        short_question = generate_usable_addresses_question()
-    elif key == "Network and Broadcast Address of a Subnet":
-        short_question = generate_network_broadcast_question()
+    if dealer is not None and dealer.has_type(key):
+        # Pregenerated pack questions come with their answer
+        short_question, correct_answer = dealer.deal(key)
+    else:
+        short_question = QUESTION_GENERATORS[key](rng)
+        # Solved once here so grading each player is a single comparison
+        correct_answer = str(generate_question_answer(key, short_question))
 
     question_format = config["question_formats"][key]
     formatted_question = question_format.format(short_question)
@@ -103,7 +243,9 @@ def generate_question(question_type: str, config: dict[str, Any],
         "question_type": key,
         "short_question": short_question,
         "trivia_question": trivia_question,
-        "time_limit": config["question_seconds"]
+        "time_limit": config["question_seconds"],
+        "correct_answer": correct_answer,
+        "question_num": question_num
     }
 
 def generate_question_answer(question_type: str, short_question: str) -> str:
@@ -113,266 +255,345 @@ def generate_question_answer(question_type: str, short_question: str) -> str:
         print(f"server.py: Unknown question type '{question_type}'", file=sys.stderr)
         sys.exit(1)
 
-    if key == "Mathematics":
-        return answer_mathematics_question(short_question)
-    elif key == "Roman Numerals":
-        return roman_to_int(short_question)
-    elif key == "Usable IP Addresses of a Subnet":
-        return answer_usable_addresses_question(short_question)
-    elif key == "Network and Broadcast Address of a Subnet":
-        return answer_network_broadcast_question(short_question)
-    
-# === HANDLE ANSWER COMPUTATION ===
-
-def answer_mathematics_question(expr: str) -> str:
-    tokens = expr.split()   
-    total = int(tokens[0])
-    i = 1
-
-    while i < len(tokens):
-        operator = tokens[i]
-        operand = int(tokens[i + 1])
-        if operator == '+':
-            total += operand
-        elif operator == '-':
-            total -= operand
-        i += 2
-
-    return str(total)
-
-def roman_to_int(s: str) -> str:
-    vals = {
-        'I': 1, 'V': 5, 'X': 10, 'L': 50,
-        'C': 100, 'D': 500, 'M': 1000
-    }
+    return SOLVERS[key](short_question)
+
+def start_round(connections, usernames, config: dict[str, Any], sessions: "Sessions | None" = None):
+#`sessions` lets dropped players reconnect during the game, they rejoin at the start of the next question
 
-    total = 0
-    prev_value = 0
-    for char in reversed(s):
-        value = vals[char]
-        if value < prev_value:
-            total -= value
-        else:
-            total += value
-        prev_value = value
-    return str(total)
-
-def answer_usable_addresses_question(subnet: str) -> str:
-    _, prefix = subnet.split('/')
-    prefix = int(prefix)
-    total_addresses = 2 ** (32 - prefix)
-    usable_addresses = max(total_addresses -2, 0)
-    return str(usable_addresses)
-
-def ip_to_int(ip_str: str) -> int:
-    parts = [int(part) for part in ip_str.split('.')]
-    n = (parts[0] << 24) + (parts[1] << 16) + (parts[2] << 8) + parts[3]
-    return n
-
-def int_to_ip(n: int) -> str:
-    return f"{(n >> 24) & 255}.{(n >> 16) & 255}.{(n >> 8) & 255}.{n & 255}"
-
-def answer_network_broadcast_question(subnet: str) -> str:
-    ip_str, prefix = subnet.split('/')
-    prefix = int(prefix)
-    ip_int = ip_to_int(ip_str)
-    mask = (0xFFFFFFFF << (32 - prefix)) & 0xFFFFFFFF
-    network = ip_int & mask
-    broadcast = network | (~mask & 0xFFFFFFFF)
-    return f"{int_to_ip(network)} and {int_to_ip(broadcast)}"
-
-# === HANDLE TRIVIA FEATURES ===
-
-def start_round(connections, usernames, config: dict[str, Any]):
-
-    scores = {addr: 0 for addr in connections.keys()}
     total_questions = len(config["question_types"])
+    board = Leaderboard()
+    for addr in connections:
+        board.add(addr, usernames[addr])
+    answer_latencies: dict[tuple[str, int], list[float]] = {addr: [] for addr in connections}
     disconnected: set[tuple[str, int]] = set()
+    seed, rng = new_game_rng(config.get("seed"))
+    logger.info(f"Game seed: {seed}")
+    event_log.record("game_start", **event_log.game_fields(seed, config))
+    dealer = open_question_dealer(config, rng, logger.info)
 
     for question_num, question_type in enumerate(config["question_types"], start=1):
-        question_data = generate_question(question_type, config, question_num)
-
-        # --- Thread threads(?)
-        results = {}
-        threads = []
-
-        def run_for_player(addr, conn, username):
-            points = handle_game_round(conn, username, question_data, config)
-            results[addr] = points
-
-        for addr, conn in connections.items():
-            if addr in disconnected:
-                continue
-            username = usernames[addr]
-            t = threading.Thread(target=run_for_player, args=(addr, conn, username), daemon=True)
-            t.start()
-            threads.append(t)
+        question_data = generate_question(question_type, config, question_num, dealer, rng)
+        question_message = {
+            "message_type": "QUESTION",
+            "question_type": question_data["question_type"],
+            "short_question": question_data["short_question"],
+            "time_limit": config["question_seconds"],
+            "trivia_question": question_data["trivia_question"],
+        }
 
-        for t in threads:
-            t.join()  # wait for all players questions to complete
+        if sessions is not None:
+            sessions.rejoin(connections, disconnected)
+        active = {addr: conn for addr, conn in connections.items() if addr not in disconnected}
+        logger.info(f"Sending question {question_num} to {len(active)} players: {question_data['trivia_question']}")
+        event_log.record("question", n=question_num, question_type=question_data["question_type"],
+                         short_question=question_data["short_question"], time_limit=question_data["time_limit"],
+                         players=len(active))
+        results, latencies = run_question(active, usernames, question_message, question_data, config, sessions)
+        if latencies:
+            logger.info(f"Question {question_num}: {len(latencies)}/{len(active)} answered, "
+                        f"slowest in {max(latencies.values()) * 1000:.0f} ms")
+        for addr, latency in latencies.items():
+            answer_latencies[addr].append(latency)
 
-        # --- Merge threads
         for addr, points in results.items():
             if points is None:
                 disconnected.add(addr)
                 continue
-            scores[addr] += points
+            board.update(addr, points)
+            if points:
+                event_log.record("score", player=player_id(addr), delta=points, score=board.score(addr))
 
         # Create and send leaderboard to all active players
         if question_num < total_questions:
-            leaderboard_text = generate_leaderboard_state(scores, usernames, config)
-            leaderboard_message = {
-                "message_type": "LEADERBOARD",
-                "state": leaderboard_text
-            }
-
-            for addr, conn in connections.items():
-                if addr in disconnected:
-                    continue
-                send_message(conn, leaderboard_message)
-                print("Leaderboard sent.")
-            time.sleep(config["question_interval_seconds"])
-
-    end_round(connections, usernames, scores, config)
-
-def handle_game_round(conn: socket.socket, username: str, question_data: dict[str, Any], 
-                      config: dict[str, Any]) -> int:
-#Main game logic - Send questions, receive answers, returns score
-#Returns None for DCs
+            active = {addr: conn for addr, conn in connections.items() if addr not in disconnected}
+            messages = leaderboard_messages(board, active, config)
+            if messages is None:
+                leaderboard_text = generate_leaderboard_state(board, config)
+                leaderboard_message = {
+                    "message_type": "LEADERBOARD",
+                    "state": leaderboard_text
+                }
+
+                broadcast_message(active.values(), leaderboard_message)
+            else:
+                send_each({active[addr]: message for addr, message in messages.items()})
+            logger.debug("Leaderboard sent.")
+            pause(config["question_interval_seconds"], sessions)
+
+    if sessions is not None:
+        sessions.rejoin(connections, disconnected)
+    end_round(connections, board, config)
+    if sessions is not None:
+        sessions.close()
+    event_log.record("game_end")
+    metrics.PLAYERS_CONNECTED.dec(len(connections) - len(disconnected))
+    report_game_summary(game_summary(seed, board, answer_latencies, config), config, log=logger.info)
+
+def run_question(connections, usernames, question_message: dict[str, Any], question_data: dict[str, Any],
+                 config: dict[str, Any], sessions: "Sessions | None" = None):
+#Main game logic - one question for every player at once
+#A single selector loop grades each answer and sends its RESULT as soon as it arrives, and the deadline
+#closes the question for everyone still pending. Returns ({addr: points, None for DCs}, {addr: seconds to answer})
+#Reconnects are handshaken from the same loop, the players they belong to rejoin at the next question
+
+    results: dict[tuple[str, int], int | None] = {}
+    latencies: dict[tuple[str, int], float] = {}
+
+    sent_at = time.monotonic()
+    deadline = sent_at + question_data["time_limit"]
+    broadcast_message(connections.values(), question_message)
+    metrics.QUESTIONS.inc()
+
+    def on_message(addr: tuple[str, int], conn: socket.socket, message: dict[str, Any] | None):
+        username = usernames[addr]
+        if not isinstance(message, dict) or message.get("message_type") == "BYE":
+            logger.info(f"{username} disconnected")
+            metrics.DISCONNECTS.inc()
+            metrics.PLAYERS_CONNECTED.dec()
+            event_log.record("disconnect", player=player_id(addr))
+            close_connection(conn)
+            results[addr] = None
+            return
+
+        latency = latencies[addr] = time.monotonic() - sent_at
+        player_answer = str(message.get("answer", ""))#.split() LMAO good testcase
+        points, result_message = grade_answer(player_answer, question_data, config, latency)
+        send_message(conn, result_message)
+        logger.debug(f"Player answer: {player_answer}, Correct: {result_message['correct']}")
+        results[addr] = points
+        event_log.record("answer", player=player_id(addr), n=question_data["question_num"], answer=player_answer,
+                         correct=result_message["correct"], points=points, latency=round(latency, 6))
 
-    question_message = {
-        "message_type": "QUESTION",
-        "question_type": question_data["question_type"],
-        "short_question": question_data["short_question"],
-        "time_limit": config["question_seconds"],
-        "trivia_question": question_data["trivia_question"],
-    }
+    with selectors.DefaultSelector() as selector:
+        waiting = 0
+        for addr, conn in connections.items():
+            # Answer may already have arrived coalesced with an earlier message
+            message = next_buffered_message(conn)
+            if message is not False:
+                on_message(addr, conn, message)
+                continue
+            try:
+                selector.register(conn, selectors.EVENT_READ, addr)
+            except (ValueError, OSError):
+                results[addr] = None
+                continue
+            waiting += 1
+        if sessions is not None:
+            sessions.register(selector)
+
+        with flushing(selector):
+            while waiting:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                if sessions is not None:
+                    remaining = sessions.timeout(remaining)
+                for key, events in selector.select(remaining):
+                    if events & selectors.EVENT_WRITE:
+                        on_writable(selector, key.fileobj)
+                    if not events & selectors.EVENT_READ:
+                        continue
+                    if sessions is not None and key.data is sessions:
+                        sessions.on_readable(selector, key.fileobj)
+                        continue
+                    message = read_available_message(key.fileobj)
+                    if message is False:
+                        continue  # answer not complete yet
+                    stop_reading(selector, key.fileobj)
+                    waiting -= 1
+                    on_message(key.data, key.fileobj, message)
+                if sessions is not None:
+                    sessions.expire(selector)
+
+    for addr in connections:
+        results.setdefault(addr, 0)  # Player timed out
+    return results, latencies
+
+def close_connection(conn: socket.socket):
+    forget_send_queue(conn)
+    try:
+        conn.shutdown(socket.SHUT_RDWR)
+    except OSError:
+        pass
+    try:
+        conn.close()
+    except OSError:
+        pass
 
-    send_message(conn, question_message)
-    print(f"Sent question to {username}: {question_data['trivia_question']}")
+def grade_answer(player_answer: str, question_data: dict[str, Any], config: dict[str, Any],
+                 latency: float | None = None) -> tuple[int, dict[str, Any]]:
+#Returns the points earned and the RESULT message for one answer
+#`latency` is seconds from the QUESTION send to the answer, used by the "speed" scoring mode
 
-    timeout = question_data["time_limit"]
+    with metrics.GRADING_SECONDS.time():
+        points, result_message = build_result(player_answer, question_data, config, latency)
 
-    try:
-        if conn.fileno() == -1:
-            return None
-        readable, _, _ = select.select([conn], [], [], timeout)
-    except (ValueError, OSError):
-        return None
+    metrics.ANSWERS.labels("true" if result_message["correct"] else "false").inc()
+    if latency is not None:
+        metrics.ANSWER_LATENCY.observe(latency)
+    return points, result_message
 
-    if not readable:
-        #Player timed out
-        return 0
-    else:
-        answer_message = receive_message(conn)
-        if answer_message is None:
-            print(f"{username} disconnected")
-            try:
-                conn.close()
-            except OSError:
-                pass
-            return None
-        
-        message_type = (answer_message.get("message_type") or "")
-        if message_type == "BYE":
-            print(f"{username} disconnected")
-            try:
-                conn.shutdown(socket.SHUT_RDWR)
-            except OSError:
-                pass
-            try:
-                conn.close()
-            except OSError:
-                pass
-            return None
-        
-        player_answer = str(answer_message.get("answer", ""))#.split() LMAO good testcase
+def build_result(player_answer: str, question_data: dict[str, Any], config: dict[str, Any],
+                 latency: float | None) -> tuple[int, dict[str, Any]]:
 
-    correct_answer = str(generate_question_answer(
-        question_data["question_type"], 
-        question_data["short_question"]
-    ))
+    correct = player_answer == question_data["correct_answer"]  # exact: case and spacing count
+    points = answer_points(correct, latency, question_data, config)
     
     extra_vals = {
     "answer": player_answer,
-    "correct_answer": correct_answer,
+    "correct_answer": question_data["correct_answer"],
     "question": question_data["trivia_question"],
+    "points": points,
     }
 
-    if player_answer == correct_answer:
+    if correct:
         feedback = anti_key_error(config["correct_answer"], config, extra_vals)
-        points = 1
     else:
         feedback = anti_key_error(config["incorrect_answer"], config, extra_vals)
-        points = 0
-    
-    if player_answer is None:
-        return 0
-    
-    if player_answer is not None:
 
-        result_message = {
-            "message_type": "RESULT",
-            "correct": player_answer == correct_answer,
-            "feedback": feedback
-        }
-        
-        send_message(conn, result_message)
-        print(f"Player answer: {player_answer}, Correct answer: {correct_answer}")
+    result_message = {
+        "message_type": "RESULT",
+        "correct": correct,
+        "feedback": feedback
+    }
+    return points, result_message
 
-    return points
+def answer_points(correct: bool, latency: float | None, question_data: dict[str, Any],
+                  config: dict[str, Any]) -> int:
+#"correct" mode: 1 per correct answer. "speed" mode: up to speed_max_points, falling linearly to 1
+#over the time limit, so every correct answer is still worth something
 
-def generate_leaderboard_state(scores: dict[tuple[str,int], int], usernames, config: dict[str, Any]) -> str:
+    if not correct:
+        return 0
+    if config.get("scoring_mode", "correct") != "speed" or latency is None:
+        return 1
 
-    rows = [(addr, usernames.get(addr, "?"), score) for addr, score in scores.items()]
-    rows.sort(key=lambda r: (-r[2], r[1], r[0]))
+    max_points = max_points_per_question(config)
+    time_limit = question_data["time_limit"]
+    if time_limit <= 0:
+        return max_points
+    remaining = max(time_limit - latency, 0) / time_limit
+    return max(1, math.ceil(max_points * remaining))
 
-    lines = []
-    rank = 1
-    prev_score = None
-    players_seen = 0
+def max_points_per_question(config: dict[str, Any]) -> int:
+    if config.get("scoring_mode", "correct") == "speed":
+        return config.get("speed_max_points", 10)
+    return 1
 
-    for _, uname, points in rows:
-        players_seen += 1
-        if prev_score is not None and points < prev_score:
-            rank = players_seen
-        prev_score = points
+# --- Answer latency summary
 
-        if points == 1:
-            noun = config["points_noun_singular"]
-        else:
-            noun = config["points_noun_plural"]
+def game_summary(seed: int, board: Leaderboard, latencies: dict[Any, list[float]],
+                 config: dict[str, Any]) -> dict[str, Any]:
+#End-of-game summary: standings plus answer latencies (QUESTION sent -> answer received, monotonic clock)
 
-        lines.append(f"{rank}. {uname}: {points} {noun}")
+    players = board.standings()
+    return {
+        "seed": seed,
+        "scoring_mode": config.get("scoring_mode", "correct"),
+        "questions": len(config["question_types"]),
+        "latency": latency_stats([t for times in latencies.values() for t in times]),
+        "players": [
+            {
+                "rank": board.rank(player),
+                "username": board.usernames[player],
+                "score": board.score(player),
+                "latency": latency_stats(latencies.get(player, [])),
+                "latencies_ms": [round(t * 1000, 3) for t in latencies.get(player, [])],
+            }
+            for player in players
+        ],
+    }
 
-    return "\n".join(lines)
+def report_game_summary(summary: dict[str, Any], config: dict[str, Any], room_id: int = 1,
+                        log: Callable[[str], Any] = print):
+    stats = summary["latency"]
+    if stats["count"]:
+        log(f"Answer latency over {stats['count']} answers: p50 {stats['p50_ms']:.1f} ms, "
+            f"p90 {stats['p90_ms']:.1f} ms, p99 {stats['p99_ms']:.1f} ms, max {stats['max_ms']:.1f} ms")
+    else:
+        log("No answers received")
+
+    path = config.get("summary_path")
+    if not path:
+        return
+    path = path.replace("{room}", str(room_id))
+    try:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+    except OSError as e:
+        print(f"server.py: Could not write game summary: {e}", file=sys.stderr)
+        return
+    log(f"Game summary written to {path}")
+
+def generate_leaderboard_state(board: Leaderboard, config: dict[str, Any]) -> str:
+
+    return "\n".join(board.lines(config))
+
+def generate_leaderboard_states(board: Leaderboard, players, config: dict[str, Any]) -> dict[Any, str]:
+    #"personalized" mode: everyone gets the same top rows plus a window around their own row
+    #Positions come from passes over the standings, and only rows someone is sent get formatted: the top
+    #rows once, then each run of positions players' windows cover, so a big lobby sends O(top + window)
+    #lines per player instead of every line to every player
+    top = config.get("leaderboard_top", 10)
+    window = config.get("leaderboard_window", 2)
+    standings = board.standings()
+    total = len(standings)
+    head = board.lines(config, 0, top)
+    wanted = players if isinstance(players, (set, dict)) else set(players)
+    present = bytearray([player in wanted for player in standings])
+
+    lines: list[str | None] = [None] * total
+    formatted = top
+    end = 0
+    while (first := present.find(1, end)) != -1:
+        end = present.find(0, first)
+        if end == -1:
+            end = total
+        start = max(first - window, formatted)
+        stop = min(end + window, total)
+        if start < stop:
+            lines[start:stop] = board.lines(config, start, stop)
+            formatted = stop
+
+    head_text = "\n".join(head)
+    gap_text = "\n".join(head + ["..."])
+    states = {}
+    for position, player in enumerate(standings):
+        if not present[position]:
+            continue
+        stop = position + window + 1
+        start = position - window
+        if stop <= top:
+            states[player] = head_text
+        elif start > top:
+            states[player] = gap_text + "\n" + "\n".join(lines[start:stop])
+        elif not head:
+            states[player] = "\n".join(lines[top:stop])
+        elif top >= total:
+            states[player] = head_text
+        else:
+            states[player] = head_text + "\n" + "\n".join(lines[top:stop])
+    return states
 
-def end_round(connections, usernames, scores, config: dict[str, Any]):
+def leaderboard_messages(board: Leaderboard, players, config: dict[str, Any]) -> dict[Any, dict[str, Any]] | None:
+    #None in the default "full" mode, where a single LEADERBOARD message is broadcast to everyone
+    if config.get("leaderboard_mode", "full") != "personalized":
+        return None
+    states = generate_leaderboard_states(board, players, config)
+    messages: dict[str, dict[str, Any]] = {}
+    for player, state in states.items():
+        message = messages.get(state)
+        if message is None:
+            message = messages[state] = {"message_type": "LEADERBOARD", "state": state}
+        states[player] = message
+    return states
 
-    rows = [(addr, usernames.get(addr, "?"), score) for addr, score in scores.items()]
-    rows.sort(key=lambda r: (-r[2], r[1], r[0]))
+def generate_final_standings(board: Leaderboard, config: dict[str, Any]) -> str:
 
-    top = rows[0][2]
-    winner_addrs = [addr for addr, _, points in rows if points == top]
-    winners = [usernames.get(addr, "?") for addr in winner_addrs]
+    winners = [board.usernames[player] for player in board.leaders()]
 
     lines = [anti_key_error(config["final_standings_heading"], config)]
-    rank = 1
-    prev_score = None
-    players_seen = 0
-
-    for _, uname, points in rows:
-        players_seen += 1
-        if prev_score is not None and points < prev_score:
-            rank = players_seen
-        prev_score = points
-
-        if points == 1:
-            noun = config["points_noun_singular"]
-        else:
-            noun = config["points_noun_plural"]
-        
-        lines.append(f"{rank}. {uname}: {points} {noun}")
+    lines.extend(board.lines(config))
 
     winners_str = ", ".join(winners)
 
@@ -384,20 +605,20 @@ def end_round(connections, usernames, scores, config: dict[str, Any]):
     else:
         lines.append(multiple_winners)
 
-    final_standings = "\n".join(lines)
+    return "\n".join(lines)
+
+def end_round(connections, board: Leaderboard, config: dict[str, Any]):
 
     finished_message = {
         "message_type": "FINISHED",
-        "final_standings": final_standings
+        "final_standings": generate_final_standings(board, config)
     }
 
-    for addr, conn in connections.items():
-        try:
-            send_message(conn, finished_message)
-        except Exception:
-            pass
+    broadcast_message(connections.values(), finished_message)
+    drain_send_queues(SEND_TIMEOUT)
 
     for addr, conn in connections.items():
+        forget_send_queue(conn)
         try:
             conn.close()
         except Exception:
@@ -405,33 +626,304 @@ def end_round(connections, usernames, scores, config: dict[str, Any]):
 
 # --- OTHER HELPERS
 
-def read_hi_message(conn: socket.socket, timeout: float = 2.0) -> dict[str, Any] | None:
-
+def prepare_connection(conn: socket.socket):
+#Non-blocking for the selector loops, and TCP_NODELAY because a question's RESULT, LEADERBOARD and QUESTION
+#go out as separate small sends that Nagle would otherwise hold back until the client's delayed ACK
     conn.setblocking(False)
-    buffer = b""
-    start = time.time()
+    if conn.family in (socket.AF_INET, socket.AF_INET6):
+        conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+def accept_players(server_sock: socket.socket, max_players: int, timeout: float = HI_TIMEOUT):
+#Accepts max_players connections and handshakes them concurrently through one selector
+#A client gets `timeout` seconds from accept to send HI, so one slow client only holds up itself. As before,
+#a client whose HI is invalid, late or missing is dropped without its slot being offered to anyone else:
+#the game starts with whoever finished the handshake
+
+    connections: dict[tuple[str, int], socket.socket] = {}
+    usernames: dict[tuple[str, int], str] = {}
+    offered_codecs: dict[tuple[str, int], Codec] = {}
+    pending: dict[socket.socket, tuple[str, int]] = {}
+    deadlines: deque[tuple[float, socket.socket]] = deque()  # accept order == deadline order
+
+    def drop(conn: socket.socket):
+        metrics.HANDSHAKE_FAILURES.inc()
+        selector.unregister(conn)
+        del pending[conn]
+        conn.close()
+
+    server_sock.setblocking(False)
+    with selectors.DefaultSelector() as selector:
+        selector.register(server_sock, selectors.EVENT_READ)
+        accepted = 0
+
+        while accepted < max_players or pending:
+            free_slots = max_players - accepted
+
+            wait = None
+            if deadlines:
+                wait = max(deadlines[0][0] - time.monotonic(), 0)
+
+            for key, _ in selector.select(wait):
+                if key.fileobj is server_sock:
+                    for _ in range(free_slots):
+                        try:
+                            conn, addr = server_sock.accept()
+                        except (BlockingIOError, InterruptedError):
+                            break
+                        logger.info(f"Accepted connection from {addr}")
+                        metrics.CONNECTIONS.inc()
+                        prepare_connection(conn)
+                        pending[conn] = addr
+                        deadlines.append((time.monotonic() + timeout, conn))
+                        selector.register(conn, selectors.EVENT_READ)
+                        accepted += 1
+                    if accepted == max_players:
+                        selector.unregister(server_sock)
+                    continue
+
+                conn = key.fileobj
+                message = read_available_message(conn)
+                if message is False:
+                    continue  # HI not complete yet
+                addr = pending[conn]
+                if not isinstance(message, dict):
+                    drop(conn)
+                    continue
 
-    while time.time() - start < timeout:
+                username = message.get("username", "")
+                if not isinstance(username, str):
+                    logger.info(f"Invalid username from {addr}")
+                    drop(conn)
+                    continue
+
+                selector.unregister(conn)
+                del pending[conn]
+                connections[addr] = conn
+                usernames[addr] = username
+                if "codecs" in message:
+                    offered_codecs[addr] = negotiate_codec(message["codecs"])
+                logger.info(f"Player joined: {username} from {addr}")
+                metrics.PLAYERS_CONNECTED.inc()
+                event_log.record("handshake", player=player_id(addr), username=username,
+                                 codec=offered_codecs[addr].name if addr in offered_codecs else "json")
+
+            now = time.monotonic()
+            while deadlines and (deadlines[0][0] <= now or deadlines[0][1] not in pending):
+                _, conn = deadlines.popleft()
+                if conn in pending:
+                    drop(conn)  # no HI in time
+
+    return connections, usernames, offered_codecs
+
+class Sessions:
+#Session tokens handed out in READY, and the reconnects that come back with them during the game
+#The listening socket stays open for the whole game. A client that lost its connection connects again and
+#sends RESUME with its token instead of HI; the new socket takes over that player's seat (score, username,
+#answer latencies) at the start of the next question. Handshakes are read from whichever selector the game
+#loop is already waiting on, so a reconnect never holds up a question
+
+    def __init__(self, server_sock: socket.socket, usernames: dict[tuple[str, int], str], config: dict[str, Any],
+                 timeout: float = HI_TIMEOUT):
+        self.server_sock = server_sock
+        self.usernames = usernames
+        self.config = config
+        self.handshake_timeout = timeout
+        self.tokens: dict[str, tuple[str, int]] = {}
+        self.pending: dict[socket.socket, tuple[tuple[str, int], float]] = {}  # conn -> (its addr, RESUME deadline)
+        self.resumed: dict[tuple[str, int], socket.socket] = {}  # player -> new socket, until the next question
+
+    def issue(self, addr: tuple[str, int]) -> str:
+        token = secrets.token_urlsafe(16)
+        self.tokens[token] = addr
+        return token
+
+    def register(self, selector: selectors.BaseSelector):
+        selector.register(self.server_sock, selectors.EVENT_READ, self)
+        for conn in self.pending:
+            selector.register(conn, selectors.EVENT_READ, self)
+
+    def timeout(self, remaining: float) -> float:
+        #Shortens a select() timeout so handshakes that run out of time are dropped promptly
+        if self.pending:
+            first_deadline = min(deadline for _, deadline in self.pending.values())
+            return max(min(remaining, first_deadline - time.monotonic()), 0)
+        return remaining
+
+    def on_readable(self, selector: selectors.BaseSelector, sock: socket.socket):
+        if sock is self.server_sock:
+            while True:
+                try:
+                    conn, addr = self.server_sock.accept()
+                except OSError:
+                    return  # nothing left to accept
+                metrics.CONNECTIONS.inc()
+                prepare_connection(conn)
+                self.pending[conn] = (addr, time.monotonic() + self.handshake_timeout)
+                selector.register(conn, selectors.EVENT_READ, self)
+
+        message = read_available_message(sock)
+        if message is False:
+            return  # RESUME not complete yet
+        selector.unregister(sock)
+        addr, _ = self.pending.pop(sock)
+        self.resume(sock, addr, message)
+
+    def expire(self, selector: selectors.BaseSelector):
+        now = time.monotonic()
+        for conn, (addr, deadline) in list(self.pending.items()):
+            if deadline <= now:
+                selector.unregister(conn)
+                del self.pending[conn]
+                self.reject(conn, addr)
+
+    def resume(self, conn: socket.socket, addr: tuple[str, int], message: dict[str, Any] | None):
+        if not isinstance(message, dict) or message.get("message_type") != "RESUME":
+            self.reject(conn, addr)
+            return
+
+        token = message.get("token")
+        player = self.tokens.get(token) if isinstance(token, str) else None
+        if player is None:
+            self.reject(conn, addr)
+            return
+
+        previous = self.resumed.pop(player, None)
+        if previous is not None:
+            close_connection(previous)  # reconnected twice before the next question
+
+        username = self.usernames[player]
+        info = anti_key_error(self.config.get("resume_info", RESUME_INFO), self.config, {"username": username})
+        ready_message = {"message_type": "READY", "info": info, "token": token, "resumed": True}
+        codec = negotiate_codec(message["codecs"]) if "codecs" in message else None
+        if codec is not None:
+            ready_message["codec"] = codec.name
+        send_message(conn, ready_message)
+        if codec is not None:
+            set_codec(conn, codec)
+
+        self.resumed[player] = conn
+        logger.info(f"{username} reconnected from {addr}, rejoining at the next question")
+        metrics.RESUMES.inc()
+        event_log.record("resume", player=player_id(player), address=player_id(addr))
+
+    def reject(self, conn: socket.socket, addr: tuple[str, int]):
+        #The game has started: anything but a RESUME with a known token is turned away
+        logger.info(f"Turned away {addr}, the game has already started")
+        metrics.HANDSHAKE_FAILURES.inc()
+        close_connection(conn)
+
+    def rejoin(self, connections: dict[tuple[str, int], socket.socket], disconnected: set[tuple[str, int]]):
+        #Swaps every reconnected player's new socket in, called between questions
+        for player, conn in self.resumed.items():
+            if player in disconnected:
+                disconnected.discard(player)
+                metrics.PLAYERS_CONNECTED.inc()
+            else:
+                close_connection(connections[player])  # the old socket never noticed the drop
+            connections[player] = conn
+        self.resumed.clear()
+
+    def close(self):
+        for conn in self.pending:
+            close_connection(conn)
+        self.pending.clear()
+        self.tokens.clear()
+
+def pause(seconds: float, sessions: Sessions | None = None):
+    #time.sleep() that keeps writing queued bytes to slow readers, and handles reconnects with `sessions`
+    deadline = time.monotonic() + seconds
+    with selectors.DefaultSelector() as selector:
+        if sessions is not None:
+            sessions.register(selector)
+        with flushing(selector):
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                if sessions is not None:
+                    remaining = sessions.timeout(remaining)
+                for key, events in selector.select(remaining):
+                    if events & selectors.EVENT_WRITE:
+                        on_writable(selector, key.fileobj)
+                    if events & selectors.EVENT_READ and sessions is not None:
+                        sessions.on_readable(selector, key.fileobj)
+                if sessions is not None:
+                    sessions.expire(selector)
+
+def read_available_message(conn: socket.socket) -> dict[str, Any] | None | bool:
+#Reads whatever is available without blocking: the next message, False if it isn't complete yet,
+#or None if the client disconnected or sent garbage
+
+    decoder = get_decoder(conn)
+    message = next_buffered_message(conn)
+    if message is not False:
+        return message
+
+    try:
+        chunk = conn.recv(65536)
+    except (BlockingIOError, InterruptedError):
+        return False
+    except OSError:
+        return None
+
+    if not chunk:
+        rest = decoder.flush()
+        if rest is None:
+            return None
         try:
-            chunk = conn.recv(1024)
-        except BlockingIOError:
-            time.sleep(0.05)
-            continue
-        except OSError:
+            message = get_codec(conn).decode(rest)
+        except ValueError:
+            metrics.DECODE_ERRORS.inc()
             return None
+        metrics.count_received(message)
+        return message
 
-        if not chunk:
-            time.sleep(0.05)
-            continue
+    metrics.BYTES_RECEIVED.inc(len(chunk))
+    decoder.feed(chunk)
+    return next_buffered_message(conn)
 
-        buffer += chunk
-        try:
-            msg = decode_message(buffer)
-            return msg
-        except json.JSONDecodeError:
-            continue
+def next_buffered_message(conn: socket.socket) -> dict[str, Any] | None | bool:
+    codec = get_codec(conn)
+    try:
+        for frame in get_decoder(conn):
+            try:
+                message = codec.decode(frame)
+            except ValueError:
+                metrics.DECODE_ERRORS.inc()
+                continue
+            metrics.count_received(message)
+            return message
+    except FrameTooLarge:
+        metrics.DECODE_ERRORS.inc()
+        return None
+    return False
 
-    return None  # timeout
+def send_ready(connections, ready_message: dict[str, Any], offered_codecs: dict[tuple[str, int], Codec],
+               sessions: Sessions | None = None):
+#READY still goes out as JSON lines; players that offered codecs learn the chosen one from it
+#and everything after READY uses that codec in both directions. With `sessions` every player's READY
+#also carries the session token it can RESUME with
+
+    messages: dict[socket.socket, dict[str, Any]] = {}
+    shared: dict[str, dict[str, Any]] = {}  # codec name -> READY naming it, when there are no tokens
+    for addr, conn in connections.items():
+        codec = offered_codecs.get(addr)
+        if sessions is not None:
+            message = {**ready_message, "token": sessions.issue(addr)}
+            if codec is not None:
+                message["codec"] = codec.name
+        elif codec is not None:
+            message = shared.get(codec.name)
+            if message is None:
+                message = shared[codec.name] = {**ready_message, "codec": codec.name}
+        else:
+            message = ready_message
+        messages[conn] = message
+    send_each(messages)
+
+    for addr, codec in offered_codecs.items():
+        if addr in connections:
+            set_codec(connections[addr], codec)
 
 def anti_key_error(template, config, extra=None, *positional):
 
@@ -453,18 +945,24 @@ def anti_key_error(template, config, extra=None, *positional):
 
 # --- MAIN
 
-def main():
+def load_config(prog: str = "server.py") -> dict[str, Any]:
     # --- Check basic setup ---
     if len(sys.argv) < 3 or sys.argv[1] != "--config":
-        print("server.py: Configuration not provided", file=sys.stderr)
+        print(f"{prog}: Configuration not provided", file=sys.stderr)
         sys.exit(1)
     config_path = Path(sys.argv[2])
     if not config_path.exists():
-        print(f"server.py: File {config_path} does not exist", file=sys.stderr)
+        print(f"{prog}: File {config_path} does not exist", file=sys.stderr)
         sys.exit(1)
     
     with config_path.open("r", encoding="utf-8") as f:
-        config = json.load(f)
+        return json.load(f)
+
+def main():
+    config = load_config()
+    metrics.setup_logging(config)
+    metrics.start_metrics_server(config)
+    event_log.open_event_log(config)
     
     port = config["port"]
     max_players = config["players"]
@@ -476,46 +974,24 @@ def main():
         print(f"server.py: Binding to port {port} was unsuccessful", file=sys.stderr)
         sys.exit(1)
     
-    server_sock.listen(max_players)
-    print(f"Server listening on port {port}...")
+    server_sock.listen(max(max_players, 128))
+    logger.info(f"Server listening on port {port}...")
 
     # --- Player checks
 
-    connections: dict[tuple[str, int], socket.socket] = {}
-    usernames: dict[tuple[str, int], str] = {}
-
-    while len(connections) < max_players:
-        conn, addr = server_sock.accept()
-        print(f"Accepted connection from {addr}")
-        connections[addr] = conn
+    connections, usernames, offered_codecs = accept_players(server_sock, max_players)
 
-    for addr, conn in list(connections.items()):
-        message = read_hi_message(conn)
-        if message is None:
-            conn.close()
-            del connections[addr]
-            continue
-
-        username = message.get("username", "")
-        if not isinstance(username, str):
-            print(f"Invalid username from {addr}")
-            conn.close()
-            del connections[addr]
-            continue
-
-        usernames[addr] = username
-        print(f"Player joined: {username} from {addr}")
-    
     if usernames:
         ready_info = anti_key_error(config["ready_info"], config)
         ready_message = {"message_type": "READY", "info": ready_info}
 
-        for addr, conn in connections.items():
-            send_message(conn, ready_message)
+        sessions = Sessions(server_sock, usernames, config)
+        send_ready(connections, ready_message, offered_codecs, sessions)
 
-        time.sleep(config["question_interval_seconds"])
+        pause(config["question_interval_seconds"], sessions)
 
-        start_round(connections, usernames, config)
+        start_round(connections, usernames, config, sessions)
+        event_log.close_event_log()
         sys.exit(0)
 
 if __name__ == "__main__":
@@ -0,0 +1,121 @@
+from functools import lru_cache
+
+#Answer engine shared by the server (grading) and the auto client
+#Everything that only depends on a small domain is precomputed at import time
+
+ROMAN_SYMBOLS = [
+    (1000, 'M'), (900, 'CM'), (500, 'D'), (400, 'CD'), (100, 'C'), (90, 'XC'),
+    (50, 'L'), (40, 'XL'), (10, 'X'), (9, 'IX'), (5, 'V'), (4, 'IV'), (1, 'I')
+]
+ROMAN_VALUES = {'I': 1, 'V': 5, 'X': 10, 'L': 50, 'C': 100, 'D': 500, 'M': 1000}
+
+def int_to_roman(number: int) -> str:
+    roman_numeral = ""
+    for (val, symbol) in ROMAN_SYMBOLS:
+        while number >= val:
+            roman_numeral += symbol
+            number -= val
+    return roman_numeral
+
+# Index = value, so ROMAN_NUMERALS[1994] == "MCMXCIV"
+ROMAN_NUMERALS = [""] + [int_to_roman(n) for n in range(1, 4000)]
+ROMAN_TO_VALUE = {numeral: str(n) for n, numeral in enumerate(ROMAN_NUMERALS) if numeral}
+
+# Index = prefix length
+PREFIX_MASKS = tuple((0xFFFFFFFF << (32 - prefix)) & 0xFFFFFFFF for prefix in range(33))
+USABLE_ADDRESSES = tuple(str(max(2 ** (32 - prefix) - 2, 0)) for prefix in range(33))
+
+QUESTION_TYPES = {
+    "mathematics": "Mathematics",
+    "roman numerals": "Roman Numerals",
+    "usable ip addresses of a subnet": "Usable IP Addresses of a Subnet",
+    "usable addresses": "Usable IP Addresses of a Subnet",
+    "network and broadcast address of a subnet": "Network and Broadcast Address of a Subnet",
+    "network broadcast": "Network and Broadcast Address of a Subnet",
+}
+
+def normalize_question_type(qtype: str) -> str:
+
+    q = qtype.strip().lower().replace("_", " ")
+    return QUESTION_TYPES.get(q)
+
+# === HANDLE ANSWER COMPUTATION ===
+
+def answer_mathematics_question(expr: str) -> str:
+    tokens = expr.split()
+    total = int(tokens[0])
+    i = 1
+
+    while i < len(tokens):
+        operator = tokens[i]
+        operand = int(tokens[i + 1])
+        if operator == '+':
+            total += operand
+        elif operator == '-':
+            total -= operand
+        i += 2
+
+    return str(total)
+
+def roman_to_int(s: str) -> str:
+    value = ROMAN_TO_VALUE.get(s)
+    if value is not None:
+        return value
+
+    # Not in canonical form (e.g. "IIII"), fall back to the subtractive rule
+    total = 0
+    prev_value = 0
+    for char in reversed(s):
+        value = ROMAN_VALUES[char]
+        if value < prev_value:
+            total -= value
+        else:
+            total += value
+        prev_value = value
+    return str(total)
+
+@lru_cache(maxsize=65536)
+def parse_subnet(subnet: str) -> tuple[int, int]:
+    ip_str, prefix = subnet.split('/')
+    return ip_to_int(ip_str), int(prefix)
+
+def answer_usable_addresses_question(subnet: str) -> str:
+    _, prefix = parse_subnet(subnet)
+    return USABLE_ADDRESSES[prefix]
+
+def ip_to_int(ip_str: str) -> int:
+    parts = [int(part) for part in ip_str.split('.')]
+    n = (parts[0] << 24) + (parts[1] << 16) + (parts[2] << 8) + parts[3]
+    return n
+
+def int_to_ip(n: int) -> str:
+    return f"{(n >> 24) & 255}.{(n >> 16) & 255}.{(n >> 8) & 255}.{n & 255}"
+
+def answer_network_broadcast_question(subnet: str) -> str:
+    ip_int, prefix = parse_subnet(subnet)
+    mask = PREFIX_MASKS[prefix]
+    network = ip_int & mask
+    broadcast = network | (~mask & 0xFFFFFFFF)
+    return f"{int_to_ip(network)} and {int_to_ip(broadcast)}"
+
+SOLVERS = {
+    "Mathematics": answer_mathematics_question,
+    "Roman Numerals": roman_to_int,
+    "Usable IP Addresses of a Subnet": answer_usable_addresses_question,
+    "Network and Broadcast Address of a Subnet": answer_network_broadcast_question,
+}
+
+def automatic_answer(question_type: str, short_question: str) -> str:
+#Lenient matching on the question type, for clients talking to servers with other wording
+
+    question_type = question_type.strip().lower()
+    if "mathematics" in question_type:
+        return answer_mathematics_question(short_question)
+    elif "roman" in question_type:
+        return roman_to_int(short_question)
+    elif "usable" in question_type:
+        return answer_usable_addresses_question(short_question)
+    elif "broadcast" in question_type or "network" in question_type:
+        return answer_network_broadcast_question(short_question)
+    else:
+        return ""
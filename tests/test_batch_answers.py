@@ -0,0 +1,46 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from batch_answers import answer_batch, grade_batch
+from question_pack import QuestionPack, build_pack, verify_pack
+from questions import QUESTION_GENERATORS
+from solvers import SOLVERS
+
+#The batch engine has to agree with the scalar solvers the game grades with, answer for answer
+
+@pytest.fixture(scope="module")
+def pack(tmp_path_factory):
+    path = tmp_path_factory.mktemp("pack") / "seeded.tqp"
+    build_pack(str(path), 5_000, list(QUESTION_GENERATORS), seed=1234, log=lambda text: None)
+    pack = QuestionPack(str(path))
+    yield pack
+    pack.close()
+
+@pytest.mark.parametrize("question_type", list(QUESTION_GENERATORS))
+def test_batch_matches_scalar_solvers(pack, question_type):
+    records = [pack.get(question_type, index) for index in range(pack.count(question_type))]
+    short_questions = [short_question for short_question, _ in records]
+
+    expected = [SOLVERS[question_type](short_question) for short_question in short_questions]
+    assert answer_batch(question_type, short_questions) == expected
+    assert [answer for _, answer in records] == expected
+
+def test_verify_pack_finds_no_mismatches(pack):
+    assert verify_pack(pack, log=lambda text: None) == 0
+
+@pytest.mark.parametrize("question_type, short_questions", [
+    ("Mathematics", ["7", "100 - 100", "1 + 2 - 3 + 4 - 5", "99 - 100 - 100 - 100 - 100"]),
+    ("Roman Numerals", ["I", "IV", "MMMCMXCIX", "IIII"]),
+    ("Usable IP Addresses of a Subnet", ["10.0.0.1/0", "10.0.0.1/31", "10.0.0.1/32", "192.168.1.7/24"]),
+    ("Network and Broadcast Address of a Subnet", ["223.255.255.255/0", "10.1.2.3/32", "172.16.5.4/12"]),
+])
+def test_batch_edge_cases(question_type, short_questions):
+    assert answer_batch(question_type, short_questions) == [SOLVERS[question_type](q) for q in short_questions]
+
+def test_batch_of_nothing():
+    assert answer_batch("Mathematics", []) == []
+
+def test_grade_batch_is_exact():
+    graded = grade_batch("Mathematics", ["1 + 2"] * 4, ["3", " 3", "3 ", "three"])
+    assert graded.tolist() == [True, False, False, False]
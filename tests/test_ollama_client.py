@@ -0,0 +1,59 @@
+import pytest
+
+pytest.importorskip("requests")
+
+from ollama_client import extract_answer
+
+#Answers are taken from free text as the model writes it: a streamed reply may only end early once the
+#answer can't change, and a finished reply gives the answer the server grades against
+
+MATH = "Mathematics"
+ROMAN = "Roman Numerals"
+USABLE = "Usable IP Addresses of a Subnet"
+NETWORK = "Network and Broadcast Address of a Subnet"
+
+@pytest.mark.parametrize("question_type, text, expected", [
+    (MATH, "95", "95"),
+    (MATH, "95.", "95"),
+    (MATH, "The answer is 95.", "95"),
+    (MATH, "100 - 5 = 95", "95"),
+    (MATH, "100 - 5 = 95.\n\nTo work this out, subtract.", "95"),
+    (MATH, "3 + 4 = 7, so the answer: 7 = 7", "7"),
+    (MATH, "5 - 100 = -95", "-95"),
+    (MATH, "-12", "-12"),
+    (MATH, "I started with 100 and took away 5, leaving 95", "95"),
+    (MATH, "No idea", None),
+    (ROMAN, "XIV is 14.", "14"),
+    (ROMAN, "14", "14"),
+    (USABLE, "A /24 has 254 usable addresses", "254"),
+    (USABLE, "10.0.0.0/30 has 2", "2"),
+    (NETWORK, "10.0.0.0 and 10.0.0.255", "10.0.0.0 and 10.0.0.255"),
+    (NETWORK, "Network: 192.168.1.0 and 192.168.1.255.", "192.168.1.0 and 192.168.1.255"),
+    (NETWORK, "192.168.1.0", None),
+    ("History", "1066", None),
+    (None, "12", None),
+])
+def test_finished_reply(question_type, text, expected):
+    assert extract_answer(question_type, text, finished=True) == expected
+
+@pytest.mark.parametrize("question_type, text, expected", [
+    (MATH, "100 - 5 = 9", None),  # "95" may still be on its way
+    (MATH, "100 - 5 = 95", None),
+    (MATH, "100 - 5 = 95.", None),  # "95.5" is still possible
+    (MATH, "100 - 5 = 95 ", "95"),
+    (MATH, "100 - 5 = 95.\n", "95"),
+    (MATH, "100 ", None),  # working may follow, only a result after "=" is final
+    (MATH, "The answer is 95. ", None),
+    (ROMAN, "14", None),
+    (ROMAN, "14 ", "14"),
+    (USABLE, "254.", None),
+    (USABLE, "254. ", "254"),
+    (NETWORK, "10.0.0.0 and 10.0.0.25", None),
+    (NETWORK, "10.0.0.0 and 10.0.0.255.", None),
+    (NETWORK, "10.0.0.0 and 10.0.0.255\n", "10.0.0.0 and 10.0.0.255"),
+])
+def test_streaming_reply(question_type, text, expected):
+    assert extract_answer(question_type, text) == expected
+
+def test_question_type_names_are_normalized():
+    assert extract_answer("mathematics", "1 + 1 = 2", finished=True) == "2"
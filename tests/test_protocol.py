@@ -0,0 +1,93 @@
+import pytest
+
+from protocol import LENGTH_PREFIX, FrameDecoder, FrameTooLarge, JSON_CODEC, CODECS
+
+#FrameDecoder has to give back exactly the frames that were sent, however the stream was cut into chunks
+
+def length_frame(body: bytes) -> bytes:
+    return len(body).to_bytes(LENGTH_PREFIX, "big") + body
+
+def decode_all(chunks, framing="line", max_frame_size=1 << 20):
+    decoder = FrameDecoder(max_frame_size, framing)
+    frames = []
+    for chunk in chunks:
+        decoder.feed(chunk)
+        frames.extend(decoder)
+    return frames, decoder
+
+@pytest.mark.parametrize("framing, chunks, expected", [
+    ("line", [b'{"a": 1}\n'], [b'{"a": 1}']),
+    ("line", [b'{"a"', b': 1', b'}\n'], [b'{"a": 1}']),
+    ("line", [b"one\ntwo\nthree\n"], [b"one", b"two", b"three"]),
+    ("line", [b"one\ntw", b"o\nthr", b"ee"], [b"one", b"two"]),
+    ("line", [b"\n"], [b""]),
+    ("line", [bytes([byte]) for byte in b"ab\ncd\n"], [b"ab", b"cd"]),
+    ("length", [length_frame(b"hello")], [b"hello"]),
+    ("length", [length_frame(b"hello")[:2], length_frame(b"hello")[2:7], length_frame(b"hello")[7:]], [b"hello"]),
+    ("length", [length_frame(b"a\nb") + length_frame(b"") + length_frame(b"cd")], [b"a\nb", b"", b"cd"]),
+    ("length", [length_frame(b"whole") + length_frame(b"partial")[:6]], [b"whole"]),
+])
+def test_frames_split_and_coalesced(framing, chunks, expected):
+    frames, _ = decode_all(chunks, framing)
+    assert frames == expected
+
+@pytest.mark.parametrize("framing, chunks", [
+    ("line", [b"x" * 17]),
+    ("line", [b"x" * 10, b"x" * 10 + b"\n"]),
+    ("line", [b"x" * 20 + b"\n"]),
+    ("length", [(17).to_bytes(LENGTH_PREFIX, "big")]),
+])
+def test_oversized_frames(framing, chunks):
+    with pytest.raises(FrameTooLarge):
+        decode_all(chunks, framing, max_frame_size=16)
+
+@pytest.mark.parametrize("framing, chunk", [("line", b"x" * 16 + b"\n"), ("length", length_frame(b"x" * 16))])
+def test_frame_at_the_size_limit(framing, chunk):
+    frames, _ = decode_all([chunk], framing, max_frame_size=16)
+    assert frames == [b"x" * 16]
+
+def test_switching_framing_mid_buffer():
+    #READY arrives as a JSON line, and the frames behind it in the same read use the negotiated framing
+    decoder = FrameDecoder()
+    decoder.feed(b'{"message_type": "READY"}\n' + length_frame(b"first") + length_frame(b"sec"))
+    assert decoder.next_frame() == b'{"message_type": "READY"}'
+    decoder.set_framing("length")
+    assert list(decoder) == [b"first", b"sec"]
+
+def test_switching_framing_after_a_partial_scan():
+    decoder = FrameDecoder()
+    decoder.feed(b"ready\n" + length_frame(b"abc")[:3])
+    assert decoder.next_frame() == b"ready"
+    assert decoder.next_frame() is None  # scanned the partial frame for b"\n"
+    decoder.set_framing("length")
+    decoder.feed(length_frame(b"abc")[3:])
+    assert list(decoder) == [b"abc"]
+
+def test_flush_returns_an_unterminated_line():
+    frames, decoder = decode_all([b"one\n", b'{"last": true}'])
+    assert frames == [b"one"]
+    assert decoder.flush() == b'{"last": true}'
+    assert decoder.flush() is None
+
+def test_many_frames_through_compaction():
+    frame = b"y" * 1000 + b"\n"
+    decoder = FrameDecoder()
+    received = 0
+    for _ in range(300):
+        decoder.feed(frame * 3)
+        received += len(list(decoder))
+    assert received == 900
+    assert len(decoder.buffer) < 1 << 17
+
+@pytest.mark.parametrize("codec", [codec for name, codec in CODECS.items() if name != "msgpack"])
+@pytest.mark.parametrize("body", [b"[1]", b"5", b'"text"', b"null", b"{"])
+def test_codecs_reject_frames_that_are_not_objects(codec, body):
+    with pytest.raises(ValueError):
+        codec.decode(body)
+
+def test_codecs_round_trip():
+    message = {"message_type": "ANSWER", "answer": "12"}
+    for codec in CODECS.values():
+        frames, _ = decode_all([codec.encode(message)], codec.framing)
+        assert [codec.decode(frame) for frame in frames] == [message]
+    assert JSON_CODEC.encode(message).endswith(b"\n")